@@ -1,24 +1,48 @@
-from fastapi import Depends, HTTPException, status
+import uuid
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import APIKeyHeader
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.revocation import revocations
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    STREAM_TOKEN_EXPIRE_SECONDS,
+)
 
+STREAM_SCOPE = "stream"
 
-def create_access_token(data: dict):
+
+def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
 
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_stream_token(userInfo: dict):
+    # Ends up in URLs and logs, so it is short-lived and only accepted by
+    # decode_stream_token.
+    return create_access_token(
+        data={
+            "id": userInfo.get("id"),
+            "sub": userInfo.get("sub"),
+            "role": userInfo.get("role"),
+            "scope": STREAM_SCOPE,
+        },
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS),
+    )
+
+
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 
-def decode_access_token(key: str = Depends(api_key_header)):
+def decode_token(key: str, scope: str = None):
     if not key:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -26,9 +50,44 @@ def decode_access_token(key: str = Depends(api_key_header)):
         )
     try:
         payload = jwt.decode(key, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid or expired token",
         )
+    if payload.get("scope") != scope:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired token",
+        )
+    if revocations.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token has been revoked",
+        )
+    return payload
+
+
+def decode_access_token(key: str = Depends(api_key_header)):
+    return decode_token(key)
+
+
+def decode_stream_token(
+    key: str = Depends(api_key_header), token: str = Query(None)
+):
+    # EventSource cannot set headers: browsers pass a token from
+    # create_stream_token as ?token=, other clients keep the header.
+    if key:
+        return decode_token(key)
+    return decode_token(token, STREAM_SCOPE)
+
+
+def decode_optional_access_token(key: str = Depends(api_key_header)):
+    # For routes that stay open to anonymous callers but want to know who
+    # called when they can.
+    if not key:
+        return None
+    try:
+        return decode_access_token(key)
+    except HTTPException:
+        return None
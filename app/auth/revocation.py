@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from db.database import connect_db
+from config import REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REVOCATIONS_CHANNEL = "token_revocations"
+
+
+def epoch(value: datetime):
+    # TIMESTAMP columns hold UTC.
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
+
+
+class RevocationList:
+    # In-memory copy of revoked_tokens and token_cutoffs, checked on every
+    # request without touching the database. The bloom filter answers the
+    # common "not revoked" case; the exact set settles its false positives.
+    # Every worker applies the NOTIFY sent with each revocation and reloads
+    # everything after a listener gap.
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.tokens = {}
+        self.cutoffs = {}
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.reloading = None
+
+    def add_token(self, jti: str, expires_at: float):
+        self.tokens[jti] = expires_at
+        self.bloom.add(jti)
+        if len(self.tokens) > self.bloom.capacity:
+            self.rebuild()
+
+    def add_cutoff(self, user_id: int, revoked_before: float):
+        self.cutoffs[user_id] = max(self.cutoffs.get(user_id, 0), revoked_before)
+
+    def rebuild(self):
+        # Drops expired tokens and resizes the filter to fit the rest.
+        now = time.time()
+        self.tokens = {
+            jti: expires_at for jti, expires_at in self.tokens.items() if expires_at > now
+        }
+        capacity = max(self.capacity, len(self.tokens) * 2)
+        bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self.tokens:
+            bloom.add(jti)
+        self.bloom = bloom
+
+    def merge(self, tokens: dict, cutoffs: dict):
+        # Revocations only ever accumulate, so a reload is merged into what
+        # is already known. Anything applied while the reload was reading
+        # the database, from a NOTIFY or a local revoke, is kept.
+        self.tokens = {**tokens, **self.tokens}
+        for user_id, revoked_before in cutoffs.items():
+            self.add_cutoff(user_id, revoked_before)
+        self.rebuild()
+
+    def is_revoked(self, payload: dict):
+        jti = payload.get("jti")
+        if jti is not None and jti in self.bloom and jti in self.tokens:
+            return True
+        cutoff = self.cutoffs.get(payload.get("id"))
+        # iat has whole seconds only. A token issued in the same second as
+        # the cutoff is let through rather than rejecting the fresh login
+        # that usually follows a "revoke all". Tokens issued before jti/iat
+        # were added count as issued at 0.
+        return cutoff is not None and payload.get("iat", 0) < math.floor(cutoff)
+
+    def handle_event(self, event: dict):
+        if "jti" in event:
+            self.add_token(event["jti"], event["expires_at"])
+        else:
+            self.add_cutoff(event["user_id"], event["revoked_before"])
+
+    async def reload(self):
+        conn = await connect_db()
+        try:
+            tokens = await conn.fetch(
+                """
+                SELECT jti, expires_at FROM revoked_tokens
+                WHERE expires_at > timezone('utc', now())
+                """
+            )
+            cutoffs = await conn.fetch("SELECT user_id, revoked_before FROM token_cutoffs")
+        finally:
+            await conn.close()
+        self.merge(
+            {row["jti"]: epoch(row["expires_at"]) for row in tokens},
+            {row["user_id"]: epoch(row["revoked_before"]) for row in cutoffs},
+        )
+
+    def schedule_reload(self):
+        # Listener gap handlers are synchronous.
+        if self.reloading is None or self.reloading.done():
+            self.reloading = asyncio.create_task(self.reload())
+            self.reloading.add_done_callback(self.log_failure)
+
+    def log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Reloading token revocations failed", exc_info=task.exception()
+            )
+
+
+revocations = RevocationList(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
-from auth.jwt import create_access_token, decode_access_token
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Optional
+from auth.jwt import (
+    create_access_token,
+    decode_access_token,
+    decode_optional_access_token,
+)
 from auth.utils import verify_password
 from auth.schemas.token import Token
 from auth.schemas.users import UserLogin
 from auth.services.users import (
+    USER_FIELD_COLUMNS,
     get_user_by_email,
     get_all_users,
     get_users_count,
@@ -11,11 +20,27 @@ from auth.services.users import (
     get_user_by_id,
     update_user,
     delete_user,
+    get_user_updated_at,
+    get_users_by_ids,
 )
 from auth.schemas.users import UserOut, UserSignup, PaginatedUserResponse, UserUpdate
+from auth.services.tokens import revoke_token, revoke_user_tokens
+from services.audit import record_change
 from fastapi import Query
 from passlib.context import CryptContext
 from middlewares.user_check import is_superadmin, is_manager, is_artist
+from utils.batch import batch_response, parse_ids
+from utils.fields import parse_fields
+from utils.deadline import run_until_deadline
+from utils.single_flight import scope_key, single_flight
+from utils.conditional import (
+    PreconditionFailed,
+    cache_headers,
+    check_if_match,
+    has_conditional_headers,
+    is_not_modified,
+)
+from config import LIST_DEADLINE_SECONDS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -23,7 +48,9 @@ router = APIRouter()
 
 
 @router.post("/signup")
-async def signup(user: UserSignup):
+async def signup(
+    user: UserSignup, userInfo: dict = Depends(decode_optional_access_token)
+):
     existing = await get_user_by_email(user.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -43,6 +70,7 @@ async def signup(user: UserSignup):
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    record_change(userInfo, "users", user["id"], "create", after=user)
     return {"user": dict(user)}
 
 
@@ -58,13 +86,40 @@ async def login(data: UserLogin):
     return {"access_token": token, "token_type": "bearer"}
 
 
+@router.post("/logout", status_code=204)
+async def logout(userInfo: dict = Depends(decode_access_token)):
+    if "jti" in userInfo:
+        await revoke_token(userInfo["jti"], userInfo["id"], userInfo["exp"])
+    else:
+        # Tokens issued before jti was added can only be revoked together.
+        await revoke_user_tokens(userInfo["id"])
+
+
+@router.post("/users/{user_id}/revoke-tokens", status_code=204)
+async def revoke_tokens(
+    user_id: int = Path(..., ge=1),
+    userInfo: dict = Depends(decode_access_token),
+):
+    if not is_superadmin(userInfo) and userInfo.get("id") != user_id:
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    user = await get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    await revoke_user_tokens(user_id)
+
+
 @router.get(
     "/users",
     response_model=PaginatedUserResponse,
 )
 async def list_users(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, le=100),
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
     userInfo: dict = Depends(decode_access_token),
 ):
     if not is_superadmin(userInfo):
@@ -72,9 +127,39 @@ async def list_users(
             status_code=403, detail="You are not allowed to access this resource"
         )
 
-    rows = await get_all_users(page, page_size)
-    total_users = await get_users_count()
+    columns = parse_fields(fields, USER_FIELD_COLUMNS)
+    batch_ids = parse_ids(ids)
+    if batch_ids is not None:
+        users = await get_users_by_ids(batch_ids)
+        return batch_response(
+            "users", batch_ids, users, columns or [*USER_FIELD_COLUMNS]
+        )
+
+    key = ("user_list", page, page_size, tuple(columns or ()), scope_key(userInfo))
+    rows, total_users = await run_until_deadline(
+        request,
+        LIST_DEADLINE_SECONDS,
+        lambda: single_flight.do(
+            key,
+            lambda: asyncio.gather(
+                get_all_users(page, page_size, columns), get_users_count()
+            ),
+        ),
+    )
     total_pages = (total_users + page_size - 1) // page_size
+    if columns:
+        # Partial rows do not fit UserOut, send them as they come.
+        return JSONResponse(
+            jsonable_encoder(
+                {
+                    "page": page,
+                    "page_size": page_size,
+                    "total_users": total_users,
+                    "total_pages": total_pages,
+                    "users": [dict(row) for row in rows],
+                }
+            )
+        )
 
     users = []
     for row in rows:
@@ -114,6 +199,8 @@ async def get_page_data():
     response_model=UserOut,
 )
 async def get_user(
+    request: Request,
+    response: Response,
     user_id: int = Path(..., ge=1),
     userInfo: dict = Depends(decode_access_token),
 ):
@@ -122,10 +209,19 @@ async def get_user(
             status_code=403, detail="You are not allowed to access this resource"
         )
 
+    if has_conditional_headers(request):
+        updated_at = await get_user_updated_at(user_id)
+        if not updated_at:
+            raise HTTPException(status_code=404, detail="User not found")
+        headers = cache_headers("users", user_id, updated_at)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
     user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user = dict(user)
+    response.headers.update(cache_headers("users", user_id, user["updated_at"]))
 
     user["created_at"] = str(user["created_at"])
     user["updated_at"] = str(user["updated_at"])
@@ -134,14 +230,38 @@ async def get_user(
 
 
 @router.put("/users/{user_id}", response_model=UserOut)
-async def update(user_id: int = Path(..., ge=1), user: UserUpdate = ...):
+async def update(
+    request: Request,
+    response: Response,
+    user_id: int = Path(..., ge=1),
+    user: UserUpdate = ...,
+    userInfo: dict = Depends(decode_optional_access_token),
+):
 
-    existing_user = await get_user_by_id(user_id)
-    if not existing_user:
+    updated_at = await get_user_updated_at(user_id)
+    if not updated_at:
         raise HTTPException(status_code=404, detail="User not found")
+    expected_updated_at = None
+    if "if-match" in request.headers:
+        check_if_match(request, cache_headers("users", user_id, updated_at)["ETag"])
+        expected_updated_at = updated_at
 
     update_data = user.model_dump(exclude_unset=True)
-    updated_data = await update_user(user_id, UserUpdate(**update_data))
+    try:
+        before, updated_data = await update_user(
+            user_id, UserUpdate(**update_data), expected_updated_at
+        )
+    except PreconditionFailed:
+        raise HTTPException(
+            status_code=412, detail="Resource has been modified by another request"
+        )
+    if updated_data is None:
+        # Deleted between the precondition read and the locked update.
+        raise HTTPException(status_code=404, detail="User not found")
+    record_change(userInfo, "users", user_id, "update", before, updated_data)
+    response.headers.update(
+        cache_headers("users", user_id, updated_data["updated_at"])
+    )
     updated_data["dob"] = str(updated_data["dob"])
     updated_data["created_at"] = str(updated_data["created_at"])
     updated_data["updated_at"] = str(updated_data["updated_at"])
@@ -166,3 +286,4 @@ async def delete(
         raise HTTPException(status_code=404, detail="User not found")
 
     await delete_user(user_id)
+    record_change(userInfo, "users", user_id, "delete", before=existing_user)
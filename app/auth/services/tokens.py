@@ -0,0 +1,57 @@
+import json
+from datetime import datetime, timezone
+from db.database import connect_db
+from auth.revocation import TOKEN_REVOCATIONS_CHANNEL, revocations
+
+
+def utc_naive(timestamp: float):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+async def revoke_token(jti: str, user_id: int, expires_at: float):
+    conn = await connect_db()
+    try:
+        # The notification is delivered to every worker on commit.
+        async with conn.transaction():
+            await conn.execute(
+                """
+                INSERT INTO revoked_tokens (jti, user_id, expires_at)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (jti) DO NOTHING
+                """,
+                jti,
+                user_id,
+                utc_naive(expires_at),
+            )
+            await conn.execute(
+                "SELECT pg_notify($1, $2)",
+                TOKEN_REVOCATIONS_CHANNEL,
+                json.dumps({"jti": jti, "expires_at": expires_at}),
+            )
+        revocations.add_token(jti, expires_at)
+    finally:
+        await conn.close()
+
+
+async def revoke_user_tokens(user_id: int):
+    revoked_before = datetime.now(timezone.utc).timestamp()
+    conn = await connect_db()
+    try:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                INSERT INTO token_cutoffs (user_id, revoked_before)
+                VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET revoked_before = EXCLUDED.revoked_before
+                """,
+                user_id,
+                utc_naive(revoked_before),
+            )
+            await conn.execute(
+                "SELECT pg_notify($1, $2)",
+                TOKEN_REVOCATIONS_CHANNEL,
+                json.dumps({"user_id": user_id, "revoked_before": revoked_before}),
+            )
+        revocations.add_cutoff(user_id, revoked_before)
+    finally:
+        await conn.close()
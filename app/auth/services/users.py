@@ -1,6 +1,26 @@
+from datetime import datetime
 from db.database import connect_db
 from asyncpg import InvalidTextRepresentationError
 from auth.schemas.users import UserUpdate
+from utils.conditional import PreconditionFailed
+from utils.cache import artist_cache, artist_by_user_cache, music_cache, user_cache
+from utils.fields import select_list
+from services.purger import purger
+from config import SOFT_DELETE
+
+USER_FIELD_COLUMNS = {
+    "id": "id",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "email": "email",
+    "role": "role",
+    "phone": "phone",
+    "dob": "dob",
+    "gender": "gender",
+    "address": "address",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
 
 
 async def create_user(
@@ -42,16 +62,57 @@ async def create_user(
 async def get_user_by_email(email: str):
     conn = await connect_db()
     try:
-        return await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
+        return await conn.fetchrow("SELECT * FROM users WHERE email = $1 AND deleted_at IS NULL", email)
     finally:
         await conn.close()
 
 
 async def get_user_by_id(user_id: int):
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = user_cache.version()
     conn = await connect_db()
     try:
-        return await conn.fetchrow(
-            "SELECT id,email,first_name,last_name,dob,role,phone,gender,address,created_at,updated_at FROM users WHERE id = $1",
+        user = await conn.fetchrow(
+            "SELECT id,email,first_name,last_name,dob,role,phone,gender,address,created_at,updated_at FROM users WHERE id = $1 AND deleted_at IS NULL",
+            user_id,
+        )
+        user_cache.set(user_id, user, version)
+        return user
+    finally:
+        await conn.close()
+
+
+async def get_users_by_ids(user_ids: list):
+    users = {}
+    for user_id in user_ids:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            users[user_id] = cached
+    missing = [user_id for user_id in user_ids if user_id not in users]
+    if not missing:
+        return users
+    version = user_cache.version()
+    conn = await connect_db()
+    try:
+        rows = await conn.fetch(
+            "SELECT id,email,first_name,last_name,dob,role,phone,gender,address,created_at,updated_at FROM users WHERE id = ANY($1::int[]) AND deleted_at IS NULL",
+            missing,
+        )
+        for row in rows:
+            user_cache.set(row["id"], row, version)
+            users[row["id"]] = row
+        return users
+    finally:
+        await conn.close()
+
+
+async def get_user_updated_at(user_id: int):
+    conn = await connect_db()
+    try:
+        return await conn.fetchval(
+            "SELECT updated_at FROM users WHERE id = $1 AND deleted_at IS NULL",
             user_id,
         )
     finally:
@@ -61,18 +122,19 @@ async def get_user_by_id(user_id: int):
 async def get_users_count():
     conn = await connect_db()
     try:
-        return await conn.fetchval("SELECT COUNT(*) FROM users")
+        return await conn.fetchval("SELECT COUNT(*) FROM users WHERE deleted_at IS NULL")
     finally:
         await conn.close()
 
 
-async def get_all_users(page: int, page_size: int):
+async def get_all_users(page: int, page_size: int, fields: list = None):
     conn = await connect_db()
     try:
-        offset = (page - 1) * 10
-        query = """
-          SELECT id, first_name, last_name, email, role, phone, dob, gender, address, created_at, updated_at
+        offset = (page - 1) * page_size
+        query = f"""
+          SELECT {select_list(USER_FIELD_COLUMNS, fields)}
           FROM users
+          WHERE deleted_at IS NULL
           ORDER BY id DESC
           LIMIT $1 OFFSET $2
       """
@@ -81,31 +143,50 @@ async def get_all_users(page: int, page_size: int):
         await conn.close()
 
 
-async def update_user(user_id: int, user: UserUpdate):
+async def update_user(
+    user_id: int, user: UserUpdate, expected_updated_at: datetime = None
+):
     conn = await connect_db()
 
     try:
+        async with conn.transaction():
+            # The row as this update found it, for the audit log.
+            before = await conn.fetchrow(
+                "SELECT id,email,first_name,last_name,dob,role,phone,gender,address,created_at,updated_at FROM users WHERE id = $1 AND deleted_at IS NULL FOR UPDATE",
+                user_id,
+            )
+            if not before:
+                if expected_updated_at is not None:
+                    raise PreconditionFailed()
+                return None, None
+            if (
+                expected_updated_at is not None
+                and before["updated_at"] != expected_updated_at
+            ):
+                raise PreconditionFailed()
+
+            update_fields = []
+            values = []
+            index = 1
+
+            for key, value in user.model_dump(exclude_unset=True).items():
+                update_fields.append(f"{key} = ${index}")
+                values.append(value)
+                index += 1
+
+            values.append(user_id)
+            query = f"""
+                UPDATE users
+                SET {', '.join(update_fields)}
+                WHERE id = ${index}
+                RETURNING id,email,first_name,last_name,dob,role,phone,gender,address,created_at,updated_at
+            """
 
-        update_fields = []
-        values = []
-        index = 1
-
-        for key, value in user.model_dump(exclude_unset=True).items():
-            update_fields.append(f"{key} = ${index}")
-            values.append(value)
-            index += 1
-
-        values.append(user_id)
-
-        query = f"""
-            UPDATE users
-            SET {', '.join(update_fields)}
-            WHERE id = ${index}
-            RETURNING id, first_name, last_name, email, role, phone, dob, gender, address, created_at, updated_at
-        """
-
-        updated_user = await conn.fetchrow(query, *values)
-        return dict(updated_user) if updated_user else None
+            updated_user = await conn.fetchrow(query, *values)
+        user_cache.evict(user_id)
+        user_cache.set(user_id, updated_user)
+        artist_cache.evict_where(lambda artist: artist["user_id"] == user_id)
+        return dict(before), dict(updated_user)
 
     finally:
         await conn.close()
@@ -116,10 +197,29 @@ async def delete_user(user_id: int):
 
     try:
 
-        query = f"""
-           DELETE FROM users WHERE id = $1
-        """
-        await conn.execute(query, user_id)
+        async with conn.transaction():
+            artist_id = await conn.fetchval(
+                "SELECT id FROM artist WHERE user_id = $1", user_id
+            )
+            if SOFT_DELETE:
+                await conn.execute(
+                    "UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = $1 AND deleted_at IS NULL",
+                    user_id,
+                )
+                await conn.execute(
+                    "UPDATE artist SET deleted_at = CURRENT_TIMESTAMP WHERE user_id = $1 AND deleted_at IS NULL",
+                    user_id,
+                )
+            else:
+                await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+
+        user_cache.evict(user_id)
+        artist_by_user_cache.evict(user_id)
+        if artist_id:
+            artist_cache.evict(artist_id)
+            music_cache.evict_where(lambda music: music["artist_id"] == artist_id)
+        if SOFT_DELETE:
+            purger.kick()
         return
     finally:
         await conn.close()
@@ -0,0 +1,292 @@
+"""Measure the per-route framework overhead without a database.
+
+Requests go through the whole FastAPI app over httpx's ASGI transport:
+middlewares, the JWT dependency, the Pydantic models built in the routes
+and response_model validation. The service functions the routes import are
+replaced by a stand-in that returns canned records, so what is measured is
+everything except the database.
+
+Run from the app folder:
+
+    python benchmarks/asgi_routes.py --requests 2000
+    python benchmarks/asgi_routes.py --save asgi_baseline.json
+    python benchmarks/asgi_routes.py --compare asgi_baseline.json
+
+Allocation figures come from tracemalloc in a separate, shorter pass so
+tracing does not skew the timings: peak is the high-water mark of memory
+allocated while one request runs, retained is what is still held after it.
+--compare exits with status 1 when a route got slower or allocates more
+than --tolerance allows.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth.routes.auth as auth_routes  # noqa: E402
+import routes.artist as artist_routes  # noqa: E402
+import routes.music as music_routes  # noqa: E402
+from auth.jwt import create_access_token  # noqa: E402
+from main import app  # noqa: E402
+
+ROUTE_MODULES = [artist_routes, music_routes, auth_routes]
+CREATED_AT = datetime(2024, 1, 1, 12, 0)
+TOTAL_ROWS = 100_000
+
+# label, method, path
+ROUTES = [
+    ("artist list", "GET", "/api/artist?page_size=10"),
+    ("artist list 100", "GET", "/api/artist?page_size=100"),
+    ("artist list fields", "GET", "/api/artist?page_size=100&fields=first_name,last_name"),
+    ("artist list with music", "GET", "/api/artist?page_size=10&include=music"),
+    ("artist detail", "GET", "/api/artist/1"),
+    ("artist full", "GET", "/api/artist/1/full?page_size=50"),
+    ("music list", "GET", "/api/music?page_size=10"),
+    ("music list 100", "GET", "/api/music?page_size=100"),
+    ("music list fields", "GET", "/api/music?page_size=100&fields=title,genre"),
+    ("music detail", "GET", "/api/music/1"),
+    ("music by artist", "GET", "/api/music/artist/1?page_size=100"),
+    ("user list 100", "GET", "/api/users?page_size=100"),
+    ("user detail", "GET", "/api/users/1"),
+]
+
+
+class Record(dict):
+    # Enough of asyncpg.Record for the routes: access by name and by position.
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+def user_row(id: int):
+    return Record(
+        id=id,
+        first_name="Maya",
+        last_name="Gurung",
+        email=f"maya.gurung.{id}@example.com",
+        role="artist",
+        phone="9800000000",
+        dob=datetime(1990, 5, 17),
+        gender="female",
+        address="12 Lakeside Road, Pokhara",
+        created_at=CREATED_AT,
+        updated_at=CREATED_AT,
+    )
+
+
+def artist_row(id: int):
+    user = user_row(id)
+    return Record(
+        id=id,
+        user_id=id,
+        first_release_year=2010,
+        no_of_albums_released=4,
+        created_at=CREATED_AT,
+        updated_at=CREATED_AT,
+        first_name=user["first_name"],
+        last_name=user["last_name"],
+        email=user["email"],
+        phone=user["phone"],
+        dob=user["dob"],
+        gender=user["gender"],
+        address=user["address"],
+        role=user["role"],
+        user_created_at=CREATED_AT,
+        user_updated_at=CREATED_AT,
+    )
+
+
+def music_row(id: int, artist_id: int = 1):
+    added_at = CREATED_AT + timedelta(minutes=id)
+    return Record(
+        id=id,
+        artist_id=artist_id,
+        title=f"Monsoon Letters {id}",
+        album_name="Monsoon Letters",
+        genre="rock",
+        created_at=added_at,
+        updated_at=added_at,
+    )
+
+
+def pick(row: Record, fields: list = None):
+    if fields is None:
+        return row
+    return Record({field: row[field] for field in fields})
+
+
+class StandInRepository:
+    # Same names and arguments as the service functions the routes import.
+
+    async def get_all_artist(self, page, page_size, filters=None, sort="-id", fields=None, music_limit=None):
+        rows = [pick(artist_row(id), fields) for id in range(1, page_size + 1)]
+        if music_limit:
+            for row in rows:
+                row["total_music"] = TOTAL_ROWS
+                row["music"] = [dict(music_row(id, row["id"])) for id in range(1, music_limit + 1)]
+        return rows
+
+    async def get_artists_count(self, filters=None):
+        return TOTAL_ROWS
+
+    async def get_artist_by_id(self, id):
+        return artist_row(id)
+
+    async def get_artist_with_music(self, artist_id, page, page_size):
+        artist = dict(artist_row(artist_id))
+        artist["total_music"] = TOTAL_ROWS
+        artist["music"] = [dict(music_row(id, artist_id)) for id in range(1, page_size + 1)]
+        return artist
+
+    async def get_all_music(self, page, page_size, filters=None, sort="-id", fields=None):
+        return [pick(music_row(id), fields) for id in range(1, page_size + 1)]
+
+    async def get_music_count(self, filters=None):
+        return TOTAL_ROWS
+
+    async def get_music_by_id(self, id):
+        return music_row(id)
+
+    async def get_music_by_artist_id(self, artist_id, page, page_size):
+        return [music_row(id, artist_id) for id in range(1, page_size + 1)]
+
+    async def get_music_by_artist_count(self, artist_id):
+        return TOTAL_ROWS
+
+    async def get_all_users(self, page, page_size, fields=None):
+        return [pick(user_row(id), fields) for id in range(1, page_size + 1)]
+
+    async def get_users_count(self):
+        return TOTAL_ROWS
+
+    async def get_user_by_id(self, id):
+        return user_row(id)
+
+
+def install(repository: StandInRepository):
+    names = [name for name in dir(repository) if name.startswith("get_")]
+    for module in ROUTE_MODULES:
+        for name in names:
+            if hasattr(module, name):
+                setattr(module, name, getattr(repository, name))
+
+
+async def call(client, method: str, path: str):
+    response = await client.request(method, path)
+    if response.status_code != 200:
+        raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text}")
+    return response
+
+
+async def measure(client, method: str, path: str, requests: int, alloc_requests: int):
+    for _ in range(min(requests // 10, 100)):
+        await call(client, method, path)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = await call(client, method, path)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        before_all = tracemalloc.get_traced_memory()[0]
+        for _ in range(alloc_requests):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await call(client, method, path)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - before_all
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(requests / elapsed, 1),
+        "mean_us": round(elapsed / requests * 1_000_000, 1),
+        "peak_kib": round(sum(peaks) / len(peaks) / 1024, 1),
+        "retained_b": round(retained / alloc_requests),
+        "response_bytes": len(response.content),
+    }
+
+
+def report(results: dict, baseline: dict = None, tolerance: float = 0.2):
+    regressions = []
+    print(
+        f"{'route':<24} {'ops/sec':>10} {'mean us':>10} {'peak KiB':>10} "
+        f"{'retained B':>11} {'bytes':>8}"
+    )
+    for label, result in results.items():
+        line = (
+            f"{label:<24} {result['ops_per_sec']:>10,.1f} {result['mean_us']:>10,.1f} "
+            f"{result['peak_kib']:>10,.1f} {result['retained_b']:>11,} "
+            f"{result['response_bytes']:>8,}"
+        )
+        previous = (baseline or {}).get(label)
+        if previous:
+            speed = result["ops_per_sec"] / previous["ops_per_sec"] - 1
+            memory = result["peak_kib"] / max(previous["peak_kib"], 0.1) - 1
+            line += f"   ops {speed:+.0%}  peak {memory:+.0%}"
+            if speed < -tolerance or memory > tolerance:
+                regressions.append(label)
+                line += "  REGRESSED"
+        print(line)
+    return regressions
+
+
+async def run(args):
+    install(StandInRepository())
+    token = create_access_token(data={"id": 1, "sub": "bench@example.com", "role": "super_admin"})
+    headers = {"Authorization": token}
+    if not args.compress:
+        headers["Accept-Encoding"] = "identity"
+
+    # ASGITransport does not run the lifespan, so no listener or background
+    # writers are started.
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for label, method, path in ROUTES:
+            if args.route and not any(name in label for name in args.route):
+                continue
+            results[label] = await measure(client, method, path, args.requests, args.alloc_requests)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--alloc-requests", type=int, default=100)
+    parser.add_argument("--route", action="append", help="only routes whose label contains this")
+    parser.add_argument("--compress", action="store_true", help="let the compression middleware run")
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if regressions:
+        print(f"\n{len(regressions)} route(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Compare per-artist listing and artist deletion on three music layouts.
+
+    heap       the original table: SERIAL primary key, no artist_id index
+    indexed    heap plus an (artist_id, id DESC) index
+    hash       hash partitioned on artist_id
+
+Run from the app folder against a scratch database:
+
+    python benchmarks/music_partitioning.py --rows 20000000 --artists 200000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+SCHEMA = "bench_partitioning"
+LAYOUTS = ["heap", "indexed", "hash"]
+
+
+async def build(conn, rows: int, artists: int, partitions: int):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+
+    # Track counts per artist are skewed: a few artists own most rows.
+    await conn.execute(
+        """
+        CREATE UNLOGGED TABLE music_source AS
+        SELECT
+            g AS id,
+            1 + floor($1 * power(random(), 3))::int AS artist_id,
+            'Track ' || g AS title,
+            'Album ' || (g % 5000) AS album_name,
+            (ARRAY['rnb', 'country', 'classic', 'rock', 'jazz'])[1 + g % 5] AS genre,
+            now() AS created_at,
+            now() AS updated_at
+        FROM generate_series(1, $2) AS g
+        """,
+        artists,
+        rows,
+    )
+
+    for layout in LAYOUTS:
+        await conn.execute(
+            f"""
+            CREATE TABLE artist_{layout} AS
+            SELECT g AS id FROM generate_series(1, {artists}) AS g;
+            ALTER TABLE artist_{layout} ADD PRIMARY KEY (id);
+            """
+        )
+        columns = f"""
+            id INTEGER NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES artist_{layout}(id) ON DELETE CASCADE,
+            title VARCHAR(255) NOT NULL,
+            album_name VARCHAR(255) NOT NULL,
+            genre TEXT NOT NULL,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        """
+        if layout == "hash":
+            await conn.execute(
+                f"""
+                CREATE TABLE music_{layout} ({columns}, PRIMARY KEY (artist_id, id))
+                PARTITION BY HASH (artist_id)
+                """
+            )
+            for remainder in range(partitions):
+                await conn.execute(
+                    f"""
+                    CREATE TABLE music_{layout}_p{remainder} PARTITION OF music_{layout}
+                    FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+                    """
+                )
+        else:
+            await conn.execute(f"CREATE TABLE music_{layout} ({columns}, PRIMARY KEY (id))")
+
+        started = time.perf_counter()
+        await conn.execute(f"INSERT INTO music_{layout} SELECT * FROM music_source")
+        if layout in ("indexed", "hash"):
+            await conn.execute(
+                f"CREATE INDEX ON music_{layout} (artist_id, id DESC)"
+            )
+        if layout == "hash":
+            await conn.execute(f"CREATE INDEX ON music_{layout} (id)")
+        await conn.execute(f"ANALYZE music_{layout}")
+        print(f"loaded {layout:<8} in {time.perf_counter() - started:8.1f}s")
+
+    await conn.execute("DROP TABLE music_source")
+
+
+async def timed(conn, query: str, *args):
+    started = time.perf_counter()
+    await conn.fetch(query, *args)
+    return (time.perf_counter() - started) * 1000
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+    return f"median {statistics.median(samples):9.2f} ms   p95 {p95:9.2f} ms"
+
+
+async def run(conn, artists: int, samples: int, deletes: int, seed: int):
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+    rng = random.Random(seed)
+    list_ids = [rng.randint(1, artists) for _ in range(samples)]
+    # Deleting the busiest artists is the worst case for the cascade.
+    delete_ids = [
+        row["artist_id"]
+        for row in await conn.fetch(
+            """
+            SELECT artist_id FROM music_indexed
+            GROUP BY artist_id ORDER BY COUNT(*) DESC LIMIT $1
+            """,
+            deletes,
+        )
+    ]
+
+    for layout in LAYOUTS:
+        listing = []
+        for artist_id in list_ids:
+            listing.append(
+                await timed(
+                    conn,
+                    f"""
+                    SELECT * FROM music_{layout}
+                    WHERE artist_id = $1 ORDER BY id DESC LIMIT 10 OFFSET 0
+                    """,
+                    artist_id,
+                )
+                + await timed(
+                    conn,
+                    f"SELECT COUNT(*) FROM music_{layout} WHERE artist_id = $1",
+                    artist_id,
+                )
+            )
+
+        deleting = []
+        for artist_id in delete_ids:
+            deleting.append(
+                await timed(
+                    conn, f"DELETE FROM artist_{layout} WHERE id = $1", artist_id
+                )
+            )
+
+        print(f"{layout:<8} list page + count  {summary(listing)}")
+        print(f"{layout:<8} delete artist      {summary(deleting)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000_000)
+    parser.add_argument("--artists", type=int, default=200_000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--deletes", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-build", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        if not args.skip_build:
+            await build(conn, args.rows, args.artists, args.partitions)
+        await run(conn, args.artists, args.samples, args.deletes, args.seed)
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
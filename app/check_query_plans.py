@@ -0,0 +1,401 @@
+"""Check the query plans of every service query against recorded snapshots.
+
+Seed a local database first (see generate_data.py) so the planner sees
+production-like row counts, then run from the app folder:
+
+    python check_query_plans.py            # compare against the snapshots
+    python check_query_plans.py --update   # re-record the snapshots
+
+The same check runs under pytest (tests/test_query_plans.py) whenever
+DATABASE_URL is set. Snapshots in query_plans/ were recorded on
+PostgreSQL 16 against generate_data.py with its default sizes and seed;
+plans depend on row counts, so seed the same way before comparing.
+
+Each service function is called inside a transaction that is rolled back at
+the end, and every statement it sends is also run through
+EXPLAIN (FORMAT JSON). The check fails when a plan uses a sequential scan on
+an indexed table, when any plan node costs more than its budget, or when the
+plan shape no longer matches the snapshot.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+from datetime import datetime
+import asyncpg
+import auth.services.users as users_service
+import services.album as album_service
+import services.artist as artist_service
+import services.charts as charts_service
+import services.dashboard as dashboard_service
+import services.music as music_service
+import services.similar_artists as similar_artists_service
+from auth.schemas.users import UserUpdate
+from db.database import DATABASE_URL
+from schemas.artist import ArtistCreate, ArtistUpdate
+from schemas.music import MusicCreate, MusicUpdate
+from utils.cache import flush_entity_caches
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(__file__), "query_plans", "snapshots.json")
+SERVICE_MODULES = [
+    users_service,
+    artist_service,
+    music_service,
+    album_service,
+    dashboard_service,
+    charts_service,
+    similar_artists_service,
+]
+
+INDEXED_TABLES = {
+    "users",
+    "artist",
+    "music",
+    "album",
+    "play_hourly_track",
+    "play_hourly_artist",
+    "play_hourly_genre",
+}
+DEFAULT_COST_BUDGET = 5000
+# Statements that read a whole table by design: no seq scan check, no budget.
+FULL_SCAN_STATEMENTS = {
+    "get_users_count[0]",
+    "get_artists_count[0]",
+    "get_music_count[0]",
+    "get_all_artists_without_pagination[0]",
+    "get_music_page_data[0]",
+    "compute_dashboard_summary[0]",
+}
+COST_BUDGETS = {
+    # generate_data.py draws from 38 first names, so a two letter prefix
+    # matches a few percent of all users.
+    "suggest_artists[0]": 6000,
+    "suggest_artists_full_name[0]": 6000,
+}
+
+
+class RecordingConnection:
+    def __init__(self, conn, statements: list):
+        self.conn = conn
+        self.statements = statements
+
+    async def explain(self, query: str, args: tuple):
+        if not re.match(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", query, re.I):
+            return
+        plan = await self.conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+        self.statements.append((query, json.loads(plan)[0]["Plan"]))
+
+    async def fetch(self, query, *args, **kwargs):
+        await self.explain(query, args)
+        return await self.conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        await self.explain(query, args)
+        return await self.conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        await self.explain(query, args)
+        return await self.conn.fetchval(query, *args, **kwargs)
+
+    async def execute(self, query, *args, **kwargs):
+        await self.explain(query, args)
+        return await self.conn.execute(query, *args, **kwargs)
+
+    def transaction(self, **kwargs):
+        return self.conn.transaction(**kwargs)
+
+    async def close(self):
+        # The real connection is shared by every scenario and closed at exit.
+        pass
+
+
+def plan_shape(node: dict, depth: int = 0):
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    lines = ["  " * depth + label]
+    for child in node.get("Plans", []):
+        lines.extend(plan_shape(child, depth + 1))
+    return lines
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def base_table(relation: str):
+    # Partitions of a hash partitioned music table are named music_p<N>.
+    return re.sub(r"_p\d+$", "", relation)
+
+
+def check_plan(label: str, plan: dict):
+    problems = []
+    if label in FULL_SCAN_STATEMENTS:
+        return problems
+    budget = COST_BUDGETS.get(label, DEFAULT_COST_BUDGET)
+    for node in plan_nodes(plan):
+        relation = base_table(node.get("Relation Name", ""))
+        if node["Node Type"] == "Seq Scan" and relation in INDEXED_TABLES:
+            problems.append(f"sequential scan on {relation}")
+    # Only the root's cost is what the statement pays: nodes under a Limit
+    # report the cost of running to completion, which is never reached.
+    if plan["Total Cost"] > budget:
+        problems.append(f"{plan['Node Type']} costs {plan['Total Cost']}, budget is {budget}")
+    return problems
+
+
+async def sample_rows(conn):
+    artist = await conn.fetchrow(
+        """
+        SELECT artist.*, users.first_name, users.last_name, users.phone,
+               users.dob, users.gender, users.address
+        FROM artist JOIN users ON users.id = artist.user_id
+        WHERE artist.deleted_at IS NULL
+          AND EXISTS (SELECT 1 FROM music WHERE music.artist_id = artist.id)
+        ORDER BY artist.id LIMIT 1
+        """
+    )
+    user = await conn.fetchrow(
+        """
+        SELECT * FROM users
+        WHERE deleted_at IS NULL AND role = 'artist_manager'
+        ORDER BY id LIMIT 1
+        """
+    )
+    if not (artist and user):
+        raise SystemExit("Seed the database first, see generate_data.py")
+    music = await conn.fetchrow(
+        "SELECT * FROM music WHERE artist_id = $1 ORDER BY id LIMIT 1", artist["id"]
+    )
+    return artist, music, user
+
+
+async def with_connection(module, call):
+    # For service helpers that take the connection from their caller.
+    conn = await module.connect_db()
+    try:
+        return await call(conn)
+    finally:
+        await conn.close()
+
+
+def scenarios(artist, music, user):
+    artist_update = ArtistUpdate(
+        user_id=artist["user_id"],
+        first_release_year=artist["first_release_year"],
+        no_of_albums_released=artist["no_of_albums_released"],
+        first_name=artist["first_name"],
+        last_name=artist["last_name"],
+        phone=artist["phone"],
+        dob=artist["dob"],
+        gender=artist["gender"],
+        address=artist["address"],
+    )
+    music_update = MusicUpdate(
+        artist_id=music["artist_id"],
+        title=music["title"],
+        album_name=music["album_name"],
+        genre=music["genre"],
+    )
+    user_update = UserUpdate(
+        first_name=user["first_name"],
+        last_name=user["last_name"],
+        dob=user["dob"],
+        phone=user["phone"],
+        gender=user["gender"],
+        address=user["address"],
+    )
+    return {
+        "create_user": lambda: users_service.create_user(
+            "Plan", "Check", "plan.check@example.com", "x", "artist_manager",
+            "9800000000", datetime(1990, 1, 1), "other", "Nowhere",
+        ),
+        "get_user_by_email": lambda: users_service.get_user_by_email(user["email"]),
+        "get_user_by_id": lambda: users_service.get_user_by_id(user["id"]),
+        "get_users_by_ids": lambda: users_service.get_users_by_ids([user["id"], artist["user_id"]]),
+        "get_user_updated_at": lambda: users_service.get_user_updated_at(user["id"]),
+        "get_users_count": lambda: users_service.get_users_count(),
+        "get_all_users": lambda: users_service.get_all_users(1, 10),
+        "get_all_users_narrow": lambda: users_service.get_all_users(1, 10, ["id", "email"]),
+        "update_user": lambda: users_service.update_user(user["id"], user_update),
+        "create_artist": lambda: artist_service.create_artist(
+            ArtistCreate(user_id=user["id"], first_release_year=2000, no_of_albums_released=1)
+        ),
+        "get_artist_by_id": lambda: artist_service.get_artist_by_id(artist["id"]),
+        "get_artists_by_ids": lambda: artist_service.get_artists_by_ids([artist["id"], artist["id"] + 1]),
+        "get_artist_updated_at": lambda: artist_service.get_artist_updated_at(artist["id"]),
+        "get_artists_count": lambda: artist_service.get_artists_count(),
+        "get_all_artist": lambda: artist_service.get_all_artist(1, 10),
+        "get_all_artist_by_release_year": lambda: artist_service.get_all_artist(
+            1, 10, {"first_release_year_from": 1990, "first_release_year_to": 1995}, "first_release_year"
+        ),
+        "get_all_artist_by_last_name": lambda: artist_service.get_all_artist(1, 10, None, "-last_name"),
+        "get_all_artist_by_gender_first_name": lambda: artist_service.get_all_artist(
+            1, 10, {"gender": artist["gender"]}, "first_name"
+        ),
+        "get_all_artist_narrow": lambda: artist_service.get_all_artist(
+            1, 10, None, "-id", ["id", "first_release_year"]
+        ),
+        "get_all_artist_with_music": lambda: artist_service.get_all_artist(1, 10, None, "-id", None, 5),
+        "get_artist_with_music": lambda: artist_service.get_artist_with_music(artist["id"], 1, 10),
+        "suggest_artists": lambda: artist_service.suggest_artists(artist["first_name"][:2], 10),
+        "suggest_artists_full_name": lambda: artist_service.suggest_artists(
+            f"{artist['first_name']} {artist['last_name'][:1]}", 10
+        ),
+        "get_all_artists_without_pagination": lambda: artist_service.get_all_artists_without_pagination(),
+        "update_artist": lambda: artist_service.update_artist(artist["id"], artist_update),
+        "get_artist_by_user_id": lambda: artist_service.get_artist_by_user_id(artist["user_id"]),
+        "get_albums_by_artist_id": lambda: album_service.get_albums_by_artist_id(artist["id"], 1, 10),
+        "get_albums_by_artist_count": lambda: album_service.get_albums_by_artist_count(artist["id"]),
+        "sync_album_counts": lambda: with_connection(
+            album_service, lambda conn: album_service.sync_album_counts(conn, [artist["id"]])
+        ),
+        "create_music": lambda: music_service.create_music(
+            MusicCreate(artist_id=artist["id"], title="Plan check", album_name="Plans", genre="jazz")
+        ),
+        "get_music_by_id": lambda: music_service.get_music_by_id(music["id"]),
+        "get_music_by_ids": lambda: music_service.get_music_by_ids([music["id"], music["id"] + 1]),
+        "get_music_updated_at": lambda: music_service.get_music_updated_at(music["id"]),
+        "get_music_by_artist_id": lambda: music_service.get_music_by_artist_id(artist["id"], 1, 10),
+        "get_music_by_user_id": lambda: music_service.get_music_by_user_id(artist["user_id"], 1, 10),
+        "get_music_count": lambda: music_service.get_music_count(),
+        "get_music_by_artist_count": lambda: music_service.get_music_by_artist_count(artist["id"]),
+        "get_all_music": lambda: music_service.get_all_music(1, 10),
+        "get_all_music_by_genre": lambda: music_service.get_all_music(1, 10, {"genre": "jazz"}),
+        "get_all_music_by_genre_title": lambda: music_service.get_all_music(1, 10, {"genre": "jazz"}, "title"),
+        "get_all_music_by_album": lambda: music_service.get_all_music(1, 10, {"album_name": music["album_name"]}),
+        "get_all_music_by_album_title": lambda: music_service.get_all_music(
+            1, 10, {"album_name": music["album_name"]}, "title"
+        ),
+        "get_all_music_by_artist_title": lambda: music_service.get_all_music(1, 10, {"artist_id": artist["id"]}, "-title"),
+        "get_all_music_by_title": lambda: music_service.get_all_music(1, 10, None, "title"),
+        "get_all_music_narrow": lambda: music_service.get_all_music(1, 10, None, "-id", ["id", "title"]),
+        "update_music": lambda: music_service.update_music(music["id"], music_update),
+        "compute_dashboard_summary": lambda: dashboard_service.compute_dashboard_summary(),
+        "get_top_chart_track": lambda: charts_service.get_top_chart("track", "24h", 10),
+        "get_top_chart_artist": lambda: charts_service.get_top_chart("artist", "7d", 10),
+        "get_top_chart_genre": lambda: charts_service.get_top_chart("genre", "30d", 10),
+        "refresh_similar_artists": lambda: with_connection(
+            similar_artists_service,
+            lambda conn: similar_artists_service.similar_artists.fetch(conn, [artist["id"]]),
+        ),
+        "get_music_page_data": lambda: music_service.get_music_page_data(),
+        "delete_music": lambda: music_service.delete_music(music["id"], music["artist_id"]),
+        "delete_artist": lambda: artist_service.delete_artist(artist["id"]),
+        "delete_user": lambda: users_service.delete_user(user["id"]),
+    }
+
+
+async def collect_plans(conn):
+    artist, music, user = await sample_rows(conn)
+    statements = []
+
+    async def connect_db():
+        return RecordingConnection(conn, statements)
+
+    for module in SERVICE_MODULES:
+        module.connect_db = connect_db
+
+    plans = {}
+    errors = {}
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        for name, call in scenarios(artist, music, user).items():
+            flush_entity_caches()
+            statements.clear()
+            try:
+                async with conn.transaction():
+                    await call()
+            except Exception as e:
+                errors[name] = str(e)
+            for index, (query, plan) in enumerate(statements):
+                plans[f"{name}[{index}]"] = (query, plan)
+    finally:
+        await transaction.rollback()
+    return plans, errors
+
+
+async def record_plans():
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        return await collect_plans(conn)
+    finally:
+        await conn.close()
+
+
+def save_snapshots(plans: dict):
+    shapes = {label: plan_shape(plan) for label, (_, plan) in plans.items()}
+    os.makedirs(os.path.dirname(SNAPSHOT_FILE), exist_ok=True)
+    with open(SNAPSHOT_FILE, "w") as f:
+        json.dump(shapes, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_snapshots():
+    if not os.path.exists(SNAPSHOT_FILE):
+        return {}
+    with open(SNAPSHOT_FILE) as f:
+        return json.load(f)
+
+
+def find_problems(plans: dict, snapshots: dict):
+    # label -> problems, empty when the plan is fine.
+    results = {}
+    for label, (_, plan) in sorted(plans.items()):
+        shape = plan_shape(plan)
+        problems = check_plan(label, plan)
+        if label not in snapshots:
+            problems.append("no snapshot recorded, run with --update")
+        elif snapshots[label] != shape:
+            problems.append(
+                "plan changed:\n      expected\n        "
+                + "\n        ".join(snapshots[label])
+                + "\n      actual\n        "
+                + "\n        ".join(shape)
+            )
+        results[label] = problems
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="re-record the snapshots")
+    args = parser.parse_args()
+
+    plans, errors = await record_plans()
+    if args.update:
+        save_snapshots(plans)
+        print(f"Recorded {len(plans)} plans in {SNAPSHOT_FILE}")
+    snapshots = load_snapshots()
+
+    failures = len(errors)
+    for name, error in errors.items():
+        print(f"FAIL {name} raised: {error}")
+
+    for label, problems in find_problems(plans, snapshots).items():
+        if problems:
+            failures += 1
+            print(f"FAIL {label}")
+            print("    " + " ".join(plans[label][0].split()))
+            for problem in problems:
+                print(f"    - {problem}")
+        else:
+            print(f"ok   {label}")
+
+    for label in sorted(set(snapshots) - set(plans)):
+        print(f"note {label} is in the snapshots but no longer executed")
+
+    print(f"{len(plans) + len(errors) - failures} passed, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,3 +3,84 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
+# Query string tokens for EventSource, which cannot send headers.
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", "60"))
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSION_EXCLUDED_PATHS = tuple(
+    path for path in os.getenv("COMPRESSION_EXCLUDED_PATHS", "").split(",") if path
+)
+
+ARTIST_CACHE_SIZE = int(os.getenv("ARTIST_CACHE_SIZE", "1000"))
+MUSIC_CACHE_SIZE = int(os.getenv("MUSIC_CACHE_SIZE", "5000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+ENTITY_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL_SECONDS", "60"))
+ARTIST_SUGGEST_CACHE_SIZE = int(os.getenv("ARTIST_SUGGEST_CACHE_SIZE", "500"))
+ARTIST_SUGGEST_CACHE_TTL_SECONDS = float(
+    os.getenv("ARTIST_SUGGEST_CACHE_TTL_SECONDS", "30")
+)
+
+CHANGE_FEED_BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER_SIZE", "100"))
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE_SECONDS", "15"))
+
+# Opt-in: deletes are hard deletes unless SOFT_DELETE=true.
+SOFT_DELETE = os.getenv("SOFT_DELETE", "false").lower() == "true"
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PURGE_BATCH_PAUSE_SECONDS = float(os.getenv("PURGE_BATCH_PAUSE_SECONDS", "0.2"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "60"))
+
+# Snapshot exports hold personal data. They live outside static_files and
+# are only served through /api/exports to super admins.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+# Reports contain SQL and server paths, they are served through
+# /api/profiles to super admins only.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Older reports are deleted whenever a new one is written.
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", "200"))
+PROFILE_MAX_AGE_SECONDS = float(os.getenv("PROFILE_MAX_AGE_SECONDS", "604800"))
+
+BATCH_FETCH_MAX_IDS = int(os.getenv("BATCH_FETCH_MAX_IDS", "100"))
+
+# Keep artist.no_of_albums_released equal to the artist's rows in album.
+ALBUM_SYNC_ARTIST_COUNT = os.getenv("ALBUM_SYNC_ARTIST_COUNT", "false").lower() == "true"
+
+# Deadlines for slow routes: the handler gives up with 504 and every query it
+# runs carries a matching statement_timeout. Disconnected clients are noticed
+# within DISCONNECT_POLL_SECONDS and their queries cancelled.
+LIST_DEADLINE_SECONDS = float(os.getenv("LIST_DEADLINE_SECONDS", "10"))
+DOWNLOAD_DEADLINE_SECONDS = float(os.getenv("DOWNLOAD_DEADLINE_SECONDS", "60"))
+UPLOAD_DEADLINE_SECONDS = float(os.getenv("UPLOAD_DEADLINE_SECONDS", "120"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_STALE_SECONDS = float(os.getenv("DASHBOARD_STALE_SECONDS", "300"))
+
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "10000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+
+# Play events are buffered like the audit log; charts read the hourly
+# rollups and are cached for CHARTS_CACHE_TTL_SECONDS.
+PLAYS_BUFFER_SIZE = int(os.getenv("PLAYS_BUFFER_SIZE", "100000"))
+PLAYS_BATCH_SIZE = int(os.getenv("PLAYS_BATCH_SIZE", "5000"))
+PLAYS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PLAYS_FLUSH_INTERVAL_SECONDS", "1"))
+PLAYS_MAX_EVENTS = int(os.getenv("PLAYS_MAX_EVENTS", "1000"))
+# Client timestamps outside [now - backfill, now + skew] are rejected: future
+# plays would top every chart and old ones break the BRIN ordering.
+PLAYS_MAX_BACKFILL_SECONDS = float(os.getenv("PLAYS_MAX_BACKFILL_SECONDS", "86400"))
+PLAYS_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("PLAYS_MAX_CLOCK_SKEW_SECONDS", "300"))
+CHARTS_CACHE_SIZE = int(os.getenv("CHARTS_CACHE_SIZE", "256"))
+CHARTS_CACHE_TTL_SECONDS = float(os.getenv("CHARTS_CACHE_TTL_SECONDS", "30"))
+
+# Music changes are folded into the similar artists matrix after this delay.
+SIMILAR_ARTISTS_REFRESH_SECONDS = float(os.getenv("SIMILAR_ARTISTS_REFRESH_SECONDS", "1"))
+# Release years this far apart score 1/e on the era component.
+SIMILAR_ERA_SCALE_YEARS = float(os.getenv("SIMILAR_ERA_SCALE_YEARS", "10"))
@@ -1,11 +1,30 @@
 import asyncio
 import asyncpg
 import os
+import sys
 from dotenv import load_dotenv
+from db.partition_music import partition_music_table
+from services.album import sync_album_counts
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+MIGRATIONS_DIR = "models/migrations"
+
+
+def list_migrations():
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+
+
+async def ensure_migrations_table(conn):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
 
 
 async def init_db():
@@ -13,11 +32,70 @@ async def init_db():
     try:
         with open("models/models.sql", "r") as f:
             sql = f.read()
-        await conn.execute(sql)
+        async with conn.transaction():
+            await conn.execute(sql)
+            # models.sql already contains every migration, mark them as applied.
+            await ensure_migrations_table(conn)
+            await conn.executemany(
+                "INSERT INTO schema_migrations (name) VALUES ($1) ON CONFLICT DO NOTHING",
+                [(name,) for name in list_migrations()],
+            )
         print("Database initialized successfully.")
     finally:
         await conn.close()
 
 
+async def migrate():
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await ensure_migrations_table(conn)
+        applied = {
+            row["name"] for row in await conn.fetch("SELECT name FROM schema_migrations")
+        }
+        for name in list_migrations():
+            if name in applied:
+                continue
+            with open(os.path.join(MIGRATIONS_DIR, name), "r") as f:
+                sql = f.read()
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (name) VALUES ($1)", name
+                )
+            print(f"Applied migration {name}")
+        print("Database is up to date.")
+    finally:
+        await conn.close()
+
+
+async def partition_music(partitions: int):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await partition_music_table(conn, partitions)
+        print(f"music is now hash partitioned on artist_id into {partitions} partitions.")
+    finally:
+        await conn.close()
+
+
+async def sync_album_count():
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        artist_ids = await conn.fetchval(
+            "SELECT COALESCE(array_agg(id), '{}') FROM artist WHERE deleted_at IS NULL"
+        )
+        updated = await sync_album_counts(conn, artist_ids)
+        print(f"Updated no_of_albums_released for {updated} artists.")
+    finally:
+        await conn.close()
+
+
 if __name__ == "__main__":
-    asyncio.run(init_db())
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "migrate":
+        asyncio.run(migrate())
+    elif command == "partition-music":
+        asyncio.run(partition_music(int(sys.argv[2]) if len(sys.argv) > 2 else 16))
+    elif command == "sync-album-counts":
+        asyncio.run(sync_album_count())
+    else:
+        asyncio.run(init_db())
@@ -1,6 +1,9 @@
 import asyncpg
 import os
+import time
 from dotenv import load_dotenv
+from utils.deadline import statement_timeout_ms
+from utils.profiling import current_profile
 
 load_dotenv()
 
@@ -8,4 +11,17 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 
 async def connect_db():
-    return await asyncpg.connect(DATABASE_URL)
+    server_settings = None
+    timeout = statement_timeout_ms()
+    if timeout is not None:
+        server_settings = {"statement_timeout": str(timeout)}
+
+    profile = current_profile.get()
+    if profile is None:
+        return await asyncpg.connect(DATABASE_URL, server_settings=server_settings)
+
+    started = time.perf_counter()
+    conn = await asyncpg.connect(DATABASE_URL, server_settings=server_settings)
+    profile.record_connect(time.perf_counter() - started)
+    conn.add_query_logger(profile.record_query)
+    return conn
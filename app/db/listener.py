@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import asyncpg
+from db.database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+ENTITY_CHANGES_CHANNEL = "entity_changes"
+
+
+class DatabaseListener:
+    # Holds one dedicated connection for LISTEN and fans notifications out to
+    # in-process handlers. Gap handlers run whenever notifications may have
+    # been missed (connection lost or re-established).
+
+    def __init__(self, health_check_interval: float = 30, max_retry_delay: float = 30):
+        self.handlers = {}
+        self.gap_handlers = []
+        self.health_check_interval = health_check_interval
+        self.max_retry_delay = max_retry_delay
+        self.task = None
+        self.connected = False
+
+    def subscribe(self, channel: str, handler):
+        self.handlers.setdefault(channel, []).append(handler)
+
+    def on_gap(self, handler):
+        self.gap_handlers.append(handler)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def dispatch(self, conn, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed notification on %s", channel)
+            return
+        for handler in self.handlers.get(channel, []):
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Notification handler failed on %s", channel)
+
+    def report_gap(self):
+        for handler in self.gap_handlers:
+            try:
+                handler()
+            except Exception:
+                logger.exception("Listener gap handler failed")
+
+    async def run(self):
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(DATABASE_URL)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                for channel in self.handlers:
+                    await conn.add_listener(channel, self.dispatch)
+                self.connected = True
+                # Anything committed while we were not listening is unknown.
+                self.report_gap()
+                delay = 1
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(
+                            lost.wait(), timeout=self.health_check_interval
+                        )
+                    except asyncio.TimeoutError:
+                        # Catches half-open TCP connections that never
+                        # trigger the termination listener.
+                        await conn.fetchval("SELECT 1")
+                logger.warning("Listener connection terminated")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Listener connection failed")
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self.report_gap()
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+
+listener = DatabaseListener()
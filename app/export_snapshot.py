@@ -0,0 +1,167 @@
+"""Export users, artist and music as one consistent snapshot.
+
+Run from the app folder, for example nightly from cron:
+
+    python export_snapshot.py --workers 3 --keep 7
+
+A coordinating connection opens a REPEATABLE READ transaction and exports
+its snapshot with pg_export_snapshot(). Every worker connection imports that
+snapshot before streaming its table, so all files see exactly the same
+committed rows and foreign keys match even while writes continue. Each
+table is streamed with COPY into its own gzip file; the files and a
+manifest with row counts and sha256 checksums are bundled into
+<EXPORT_DIR>/snapshot-<timestamp>.tar, which is not publicly served;
+super admins download archives from /api/exports.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import EXPORT_DIR  # noqa: E402
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Password hashes never leave the database.
+TABLE_QUERIES = {
+    "users": """
+        SELECT id, first_name, last_name, email, role, phone, dob, gender,
+               address, created_at, updated_at, deleted_at
+        FROM users
+    """,
+    "artist": "SELECT * FROM artist",
+    "music": "SELECT * FROM music",
+}
+
+
+class HashingFile:
+    # Checksums the compressed bytes on their way to disk.
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+async def export_table(pool, snapshot: str, table: str, directory: str, compress_level: int):
+    loop = asyncio.get_running_loop()
+    filename = f"{table}.csv.gz"
+    started = time.perf_counter()
+    with open(os.path.join(directory, filename), "wb") as raw:
+        hashing = HashingFile(raw)
+        with gzip.GzipFile(
+            filename=f"{table}.csv",
+            mode="wb",
+            fileobj=hashing,
+            compresslevel=compress_level,
+            mtime=0,
+        ) as compressed:
+
+            async def write(chunk):
+                # zlib releases the GIL, tables compress side by side.
+                await loop.run_in_executor(None, compressed.write, chunk)
+
+            async with pool.acquire() as conn:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    await conn.execute(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+                    status = await conn.copy_from_query(
+                        TABLE_QUERIES[table], output=write, format="csv", header=True
+                    )
+    rows = int(status.split()[-1])
+    print(f"{table:<8} {rows:>12,} rows  {hashing.size:>14,} bytes  {time.perf_counter() - started:8.1f}s")
+    return {
+        "file": filename,
+        "rows": rows,
+        "bytes": hashing.size,
+        "sha256": hashing.sha256.hexdigest(),
+    }
+
+
+def prune(keep: int):
+    archives = sorted(
+        name for name in os.listdir(EXPORT_DIR)
+        if name.startswith("snapshot-") and name.endswith(".tar")
+    )
+    for name in archives[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(EXPORT_DIR, name))
+
+
+async def run(args):
+    started = time.perf_counter()
+    exported_at = datetime.now(timezone.utc)
+    name = f"snapshot-{exported_at.strftime('%Y%m%dT%H%M%SZ')}.tar"
+    partial = os.path.join(EXPORT_DIR, f".{name}.partial")
+    os.makedirs(EXPORT_DIR, mode=0o700, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix="snapshot-", dir=EXPORT_DIR)
+    conn = await asyncpg.connect(DATABASE_URL)
+    pool = await asyncpg.create_pool(DATABASE_URL, min_size=args.workers, max_size=args.workers)
+    try:
+        # The exported snapshot stays importable only while this
+        # transaction is open, so it spans every worker's COPY.
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            snapshot = await conn.fetchval("SELECT pg_export_snapshot()")
+            results = await asyncio.gather(
+                *[
+                    export_table(pool, snapshot, table, directory, args.compress_level)
+                    for table in TABLE_QUERIES
+                ]
+            )
+
+        manifest = {
+            "exported_at": exported_at.isoformat(),
+            "snapshot": snapshot,
+            "isolation": "repeatable read",
+            "tables": dict(zip(TABLE_QUERIES, results)),
+        }
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+
+        with tarfile.open(partial, "w") as archive:
+            archive.add(os.path.join(directory, "manifest.json"), arcname="manifest.json")
+            for result in results:
+                archive.add(os.path.join(directory, result["file"]), arcname=result["file"])
+        # Readers only ever see complete archives.
+        os.replace(partial, os.path.join(EXPORT_DIR, name))
+    finally:
+        await pool.close()
+        await conn.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    prune(args.keep)
+    print(f"wrote {os.path.join(EXPORT_DIR, name)} in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=len(TABLE_QUERIES))
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(1, 10))
+    parser.add_argument("--keep", type=int, default=7, help="archives to keep, 0 keeps all")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Generate a large synthetic catalog for reproducing production-scale issues.
+
+Run from the app folder, for example:
+
+    python generate_data.py --offline --users 2000000 --artists 500000 --music 10000000
+
+The same --seed always produces the same rows, password hashes included:
+the bcrypt salt is derived from the seed. Tracks per artist follow a
+heavy-tailed distribution so a few artists own most of the catalog.
+
+The load disables the change notification and album triggers, and ALTER
+TABLE ... DISABLE TRIGGER applies to every connection. A running app would
+miss notifications, cache invalidations and album updates for its own
+writes meanwhile, so --offline is required to confirm nothing else is
+using the database. The album read model is rebuilt for the loaded
+artists at the end.
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import asyncpg
+from dotenv import load_dotenv
+from passlib.hash import bcrypt
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+FIRST_NAMES = [
+    "Aarav", "Aasha", "Bikash", "Binita", "Carlos", "Chloe", "Dawa", "Deepa",
+    "Elena", "Ethan", "Farah", "Gaurav", "Grace", "Hari", "Isabel", "Jamal",
+    "Julia", "Kiran", "Laxmi", "Liam", "Maya", "Mohan", "Nadia", "Nabin",
+    "Olivia", "Pema", "Priya", "Rajan", "Rita", "Sagar", "Sara", "Suman",
+    "Tenzin", "Uma", "Victor", "Wei", "Yasmin", "Zoe",
+]
+LAST_NAMES = [
+    "Adhikari", "Bhandari", "Brown", "Chen", "Dhakal", "Garcia", "Gurung",
+    "Johnson", "Karki", "Khan", "Lama", "Lee", "Magar", "Martin", "Nguyen",
+    "Pandey", "Patel", "Rai", "Sharma", "Shrestha", "Silva", "Smith",
+    "Tamang", "Thapa", "Williams",
+]
+STREETS = [
+    "Lakeside Road", "Durbar Marg", "Main Street", "Hill View Lane",
+    "River Street", "Temple Road", "Market Square", "Park Avenue",
+]
+CITIES = [
+    "Kathmandu", "Pokhara", "Lalitpur", "Bhaktapur", "Biratnagar",
+    "Chitwan", "Butwal", "Dharan",
+]
+ALBUM_WORDS = [
+    "Midnight", "Echoes", "River", "Golden", "Silence", "Himalayan", "Dreams",
+    "Neon", "Monsoon", "Letters", "Horizon", "Smoke", "Velvet", "Roads",
+    "Fire", "Paper", "Moon", "Songs", "Winter", "City",
+]
+GENDERS = ["male", "female", "other"]
+GENDER_WEIGHTS = [48, 48, 4]
+STAFF_ROLES = ["super_admin", "artist_manager"]
+STAFF_ROLE_WEIGHTS = [1, 20]
+GENRES = ["rnb", "country", "classic", "rock", "jazz"]
+GENRE_WEIGHTS = [20, 15, 10, 35, 20]
+EPOCH = datetime(2015, 1, 1)
+
+USER_COLUMNS = [
+    "id", "first_name", "last_name", "email", "password", "role", "phone",
+    "dob", "gender", "address", "created_at", "updated_at",
+]
+ARTIST_COLUMNS = [
+    "id", "user_id", "first_release_year", "no_of_albums_released",
+    "created_at", "updated_at",
+]
+MUSIC_COLUMNS = [
+    "id", "artist_id", "title", "album_name", "genre", "created_at", "updated_at",
+]
+LOAD_TRIGGERS = [
+    ("users", "trigger_users_notify"),
+    ("artist", "trigger_artist_notify"),
+    ("music", "trigger_music_notify"),
+    ("music", "trigger_music_album"),
+]
+
+
+def bcrypt_salt(seed: int):
+    # 22 characters of bcrypt's base64; the last one only carries 2 bits.
+    rng = random.Random(f"{seed}:salt")
+    alphabet = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    return "".join(rng.choice(alphabet) for _ in range(21)) + rng.choice(".Oeu")
+
+
+def person(rng: random.Random, serial: int, email_prefix: str = ""):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    return {
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": f"{email_prefix}{first_name}.{last_name}.{serial}@example.com".lower(),
+        "phone": f"98{rng.randrange(10**8):08d}",
+        "dob": datetime(1950, 1, 1) + timedelta(days=rng.randrange(20000)),
+        "gender": rng.choices(GENDERS, GENDER_WEIGHTS)[0],
+        "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+    }
+
+
+def generate_users(seed: int, start: int, stop: int, artist_users: int, user_base: int, password: str):
+    rng = random.Random(f"{seed}:users:{start}")
+    rows = []
+    for index in range(start, stop):
+        user_id = user_base + index
+        info = person(rng, user_id)
+        if index < artist_users:
+            role = "artist"
+        else:
+            role = rng.choices(STAFF_ROLES, STAFF_ROLE_WEIGHTS)[0]
+        created_at = EPOCH + timedelta(minutes=index)
+        rows.append(
+            (
+                user_id, info["first_name"], info["last_name"], info["email"],
+                password, role, info["phone"], info["dob"], info["gender"],
+                info["address"], created_at, created_at,
+            )
+        )
+    return rows
+
+
+def track_counts(seed: int, artists: int, music: int):
+    # Pareto weights give a long tail: most artists have a handful of
+    # tracks while the top one percent own a large share.
+    rng = random.Random(f"{seed}:track-counts")
+    weights = [rng.paretovariate(1.2) for _ in range(artists)]
+    total = sum(weights)
+    counts = [int(music * weight / total) for weight in weights]
+    for index in rng.sample(range(artists), music - sum(counts)):
+        counts[index] += 1
+    return counts
+
+
+def generate_artists(seed: int, start: int, stop: int, counts: list, first_music_id: int, user_base: int, artist_base: int, music_base: int):
+    artists = []
+    music = []
+    music_id = music_base + first_music_id
+    for index in range(start, stop):
+        rng = random.Random(f"{seed}:artist:{index}")
+        artist_id = artist_base + index
+        count = counts[index - start]
+        main_genre = rng.choices(GENRES, GENRE_WEIGHTS)[0]
+        albums = [
+            f"{rng.choice(ALBUM_WORDS)} {rng.choice(ALBUM_WORDS)}"
+            for _ in range(max(1, count // rng.randint(8, 14)))
+        ]
+        created_at = EPOCH + timedelta(minutes=index)
+        artists.append(
+            (
+                artist_id, user_base + index, rng.randint(1960, 2024),
+                len(albums), created_at, created_at,
+            )
+        )
+        # Tracks are spread evenly over roughly ten years of activity.
+        spacing = timedelta(seconds=315_360_000 // max(count, 1))
+        for track in range(count):
+            genre = main_genre if rng.random() < 0.7 else rng.choice(GENRES)
+            added_at = created_at + spacing * track
+            music.append(
+                (
+                    music_id, artist_id,
+                    f"{rng.choice(ALBUM_WORDS)} {rng.choice(ALBUM_WORDS)} {track + 1}",
+                    albums[track * len(albums) // count], genre, added_at, added_at,
+                )
+            )
+            music_id += 1
+    return artists, music
+
+
+def write_upload_csv(path: str, seed: int, rows: int):
+    # Matches the columns read by utils/bulk_create_artists_from_csv.py.
+    rng = random.Random(f"{seed}:csv")
+    with open(path, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(
+            [
+                "first_name", "last_name", "email", "password", "phone", "dob",
+                "gender", "address", "first_release_year", "no_of_albums_released",
+            ]
+        )
+        for serial in range(rows):
+            info = person(rng, serial, email_prefix="upload.")
+            writer.writerow(
+                [
+                    info["first_name"], info["last_name"], info["email"],
+                    "password123", info["phone"], info["dob"].date().isoformat(),
+                    info["gender"], info["address"], rng.randint(1960, 2024),
+                    rng.randint(1, 20),
+                ]
+            )
+
+
+async def next_id(conn, table: str):
+    return await conn.fetchval(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+
+
+async def run(args):
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    conn = await asyncpg.connect(DATABASE_URL)
+    pool = await asyncpg.create_pool(DATABASE_URL, min_size=args.workers, max_size=args.workers)
+    executor = ProcessPoolExecutor(max_workers=args.workers)
+    try:
+        user_base = await next_id(conn, "users") + 1
+        artist_base = await next_id(conn, "artist") + 1
+        music_base = await next_id(conn, "music") + 1
+        password = bcrypt.using(salt=bcrypt_salt(args.seed)).hash(args.password)
+
+        # One notification per copied row would flood the LISTEN queue, and
+        # the album table is rebuilt in one pass after the load.
+        for table, trigger in LOAD_TRIGGERS:
+            await conn.execute(f"ALTER TABLE {table} DISABLE TRIGGER {trigger}")
+
+        semaphore = asyncio.Semaphore(args.workers)
+
+        async def load(generate, *generate_args):
+            async with semaphore:
+                result = await loop.run_in_executor(executor, generate, *generate_args)
+                async with pool.acquire() as worker:
+                    if generate is generate_users:
+                        await worker.copy_records_to_table(
+                            "users", records=result, columns=USER_COLUMNS
+                        )
+                    else:
+                        artists, music = result
+                        await worker.copy_records_to_table(
+                            "artist", records=artists, columns=ARTIST_COLUMNS
+                        )
+                        await worker.copy_records_to_table(
+                            "music", records=music, columns=MUSIC_COLUMNS
+                        )
+
+        chunk = args.chunk_size
+        await asyncio.gather(
+            *[
+                load(
+                    generate_users, args.seed, start, min(start + chunk, args.users),
+                    args.artists, user_base, password,
+                )
+                for start in range(0, args.users, chunk)
+            ]
+        )
+        print(f"users   {args.users:>12,}  {time.perf_counter() - started:8.1f}s")
+
+        counts = track_counts(args.seed, args.artists, args.music)
+        jobs = []
+        first_music_id = 0
+        for start in range(0, args.artists, chunk):
+            stop = min(start + chunk, args.artists)
+            jobs.append(
+                load(
+                    generate_artists, args.seed, start, stop, counts[start:stop],
+                    first_music_id, user_base, artist_base, music_base,
+                )
+            )
+            first_music_id += sum(counts[start:stop])
+        await asyncio.gather(*jobs)
+        print(f"artists {args.artists:>12,}  music {args.music:,}  {time.perf_counter() - started:8.1f}s")
+
+        await conn.execute(
+            """
+            INSERT INTO album (artist_id, album_name, track_count, genres, first_added_at, last_added_at)
+            SELECT artist_id, album_name, COUNT(*), array_agg(DISTINCT genre ORDER BY genre),
+                   MIN(created_at), MAX(created_at)
+            FROM music
+            WHERE artist_id >= $1 AND deleted_at IS NULL
+            GROUP BY artist_id, album_name
+            """,
+            artist_base,
+        )
+
+        for table in ("users", "artist", "music"):
+            await conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+            )
+            await conn.execute(f"ANALYZE {table}")
+        await conn.execute("ANALYZE album")
+    finally:
+        for table, trigger in LOAD_TRIGGERS:
+            await conn.execute(f"ALTER TABLE {table} ENABLE TRIGGER {trigger}")
+        executor.shutdown()
+        await pool.close()
+        await conn.close()
+
+    if args.csv:
+        write_upload_csv(args.csv, args.seed, args.csv_rows)
+        print(f"wrote {args.csv_rows:,} upload rows to {args.csv}")
+    print(f"done in {time.perf_counter() - started:.1f}s, every user's password is '{args.password}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--artists", type=int, default=200_000)
+    parser.add_argument("--music", type=int, default=5_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--csv", help="also write an upload CSV for /api/artist/upload-csv")
+    parser.add_argument("--csv-rows", type=int, default=1000)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="confirm no app is connected, the load disables triggers for every session",
+    )
+    args = parser.parse_args()
+    if not args.offline:
+        parser.error(
+            "the load disables change notification and album triggers for every "
+            "connection; stop the app and pass --offline"
+        )
+    if args.artists > args.users:
+        parser.error("--artists cannot exceed --users, every artist needs a user")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,61 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from fastapi.staticfiles import StaticFiles
 from auth.routes.auth import router as user_router
 from routes.artist import router as artist_router
-from routes.music import router as music_router
+from routes.music import router as music_router, changes_router as music_changes_router
+from routes.cache import router as cache_router
+from routes.dashboard import router as dashboard_router
+from routes.audit import router as audit_router
+from routes.charts import router as charts_router
+from routes.exports import router as exports_router
+from routes.profiles import router as profiles_router
 from auth.jwt import decode_access_token
+from auth.revocation import TOKEN_REVOCATIONS_CHANNEL, revocations
+from db.listener import listener, ENTITY_CHANGES_CHANNEL
+from utils.cache import handle_entity_change, flush_entity_caches
+from utils.change_feed import change_feed
+from services.purger import purger
+from services.audit import audit_log
+from services.plays import play_log
+from services.similar_artists import similar_artists
+from middlewares.compression import CompressionMiddleware
+from middlewares.profiler import ProfilerMiddleware
+from config import (
+    COMPRESSION_MINIMUM_SIZE,
+    COMPRESSION_LEVEL,
+    COMPRESSION_EXCLUDED_PATHS,
+    PROFILE_SAMPLE_INTERVAL_MS,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener.subscribe(ENTITY_CHANGES_CHANNEL, handle_entity_change)
+    listener.subscribe(ENTITY_CHANGES_CHANNEL, change_feed.publish)
+    listener.subscribe(ENTITY_CHANGES_CHANNEL, similar_artists.handle_event)
+    listener.subscribe(TOKEN_REVOCATIONS_CHANNEL, revocations.handle_event)
+    listener.on_gap(flush_entity_caches)
+    listener.on_gap(change_feed.resync)
+    listener.on_gap(revocations.schedule_reload)
+    listener.on_gap(similar_artists.schedule_reload)
+    listener.start()
+    purger.start()
+    audit_log.start()
+    play_log.start()
+    yield
+    await play_log.stop()
+    await audit_log.stop()
+    await purger.stop()
+    await listener.stop()
 
 
 app = FastAPI(
     title="Artist Management",
+    lifespan=lifespan,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
@@ -27,6 +72,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    compress_level=COMPRESSION_LEVEL,
+    excluded_paths=COMPRESSION_EXCLUDED_PATHS,
+)
+
+app.add_middleware(
+    ProfilerMiddleware,
+    interval=PROFILE_SAMPLE_INTERVAL_MS / 1000,
+)
+
 os.makedirs("static_files", exist_ok=True)
 
 app.mount("/static", StaticFiles(directory="static_files"), name="static")
@@ -39,11 +96,43 @@ api_router.include_router(
     tags=["Artist APIs"],
     dependencies=[Depends(decode_access_token)],
 )
+# Before music_router, whose /music/{music_id} would claim the path.
+api_router.include_router(music_changes_router, tags=["Music APIs"])
 api_router.include_router(
     music_router,
     tags=["Music APIs"],
     dependencies=[Depends(decode_access_token)],
 )
+api_router.include_router(
+    cache_router,
+    tags=["Cache APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
+api_router.include_router(
+    dashboard_router,
+    tags=["Dashboard APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
+api_router.include_router(
+    audit_router,
+    tags=["Audit APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
+api_router.include_router(
+    charts_router,
+    tags=["Chart APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
+api_router.include_router(
+    exports_router,
+    tags=["Export APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
+api_router.include_router(
+    profiles_router,
+    tags=["Profile APIs"],
+    dependencies=[Depends(decode_access_token)],
+)
 
 
 app.include_router(api_router)
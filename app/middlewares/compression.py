@@ -0,0 +1,173 @@
+import gzip
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "image/", "audio/", "video/")
+
+
+def skip_compression(endpoint):
+    # Route decorator: responses from this endpoint are sent uncompressed.
+    endpoint.skip_compression = True
+    return endpoint
+
+
+def pick_encoding(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes):
+        # Sync flush so every chunk of a streaming response reaches the
+        # client as soon as it is produced.
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def compress_body(encoding: str, body: bytes, level: int):
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compress_level: int = 6,
+        excluded_paths: tuple = (),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = pick_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(
+            scope, send, encoding, self.minimum_size, self.compress_level
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    def __init__(
+        self, scope: Scope, send: Send, encoding: str, minimum_size: int, level: int
+    ):
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.level = level
+        self.start_message = None
+        self.passthrough = False
+        self.compressor = None
+
+    def should_skip(self, headers: Headers):
+        # The router stores the matched endpoint on the shared scope, so it is
+        # known by the time the response starts.
+        endpoint = self.scope.get("endpoint")
+        if getattr(endpoint, "skip_compression", False):
+            return True
+        if "content-encoding" in headers:
+            return True
+        return headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = self.should_skip(Headers(raw=message["headers"]))
+            if self.passthrough:
+                await self.downstream(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await self.downstream(start_message)
+                    await self.downstream(message)
+                    return
+                body = compress_body(self.encoding, body, self.level)
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(body))
+                await self.downstream(start_message)
+                await self.downstream(
+                    {"type": "http.response.body", "body": body, "more_body": False}
+                )
+                return
+
+            # Streaming response: compress chunk by chunk instead of buffering.
+            if self.encoding == "br":
+                self.compressor = BrotliCompressor(self.level)
+            else:
+                self.compressor = GzipCompressor(self.level)
+            headers["Content-Encoding"] = self.encoding
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.downstream(start_message)
+
+        chunk = self.compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self.downstream(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth.jwt import decode_token
+from config import PROFILE_DIR, PROFILE_MAX_REPORTS, PROFILE_MAX_AGE_SECONDS
+from utils.profiling import RequestProfile, current_profile
+
+def wants_profile(scope: Scope, headers: Headers):
+    if headers.get("x-profile") == "1":
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("profile") == ["1"]
+
+
+def is_superadmin_token(headers: Headers):
+    # Same checks as the API: revoked and stream scoped tokens are refused.
+    token = headers.get("authorization")
+    if not token:
+        return False
+    try:
+        payload = decode_token(token)
+    except HTTPException:
+        return False
+    return payload.get("role") == "super_admin"
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp, interval: float = 0.001):
+        self.app = app
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not wants_profile(scope, headers) or not is_superadmin_token(headers):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(self.interval)
+        name = "{}_{}_{}_{}".format(
+            datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
+            scope["method"],
+            scope["path"].strip("/").replace("/", "_") or "root",
+            uuid.uuid4().hex[:12],
+        )
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                summary = profile.summary()
+                response_headers = MutableHeaders(raw=message["headers"])
+                response_headers["Server-Timing"] = ", ".join(
+                    f"{key};dur={summary[key + '_ms']}"
+                    for key in ("wall", "python", "serialization", "db_wait")
+                )
+                response_headers["X-Profile-Report"] = f"/api/profiles/{name}.json"
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.store, name, scope, profile
+            )
+
+    def store(self, name: str, scope: Scope, profile: RequestProfile):
+        os.makedirs(PROFILE_DIR, mode=0o700, exist_ok=True)
+        report = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_string": scope.get("query_string", b"").decode(),
+            **profile.summary(),
+            "flamegraph": f"/api/profiles/{name}.folded",
+        }
+        with open(os.path.join(PROFILE_DIR, f"{name}.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.join(PROFILE_DIR, f"{name}.folded"), "w") as f:
+            f.write(profile.folded())
+        self.prune()
+
+    def prune(self):
+        # Names start with the timestamp, so sorting puts the oldest first.
+        reports = sorted(
+            name[: -len(".json")]
+            for name in os.listdir(PROFILE_DIR)
+            if name.endswith(".json")
+        )
+        expired = reports[: max(len(reports) - PROFILE_MAX_REPORTS, 0)]
+        cutoff = time.time() - PROFILE_MAX_AGE_SECONDS
+        for name in reports[len(expired):]:
+            with contextlib.suppress(FileNotFoundError):
+                if os.path.getmtime(os.path.join(PROFILE_DIR, f"{name}.json")) < cutoff:
+                    expired.append(name)
+        for name in expired:
+            for suffix in (".json", ".folded"):
+                # Requests finishing together prune the same files.
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(PROFILE_DIR, f"{name}{suffix}"))
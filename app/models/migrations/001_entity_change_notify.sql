@@ -0,0 +1,44 @@
+-- Publish row changes on the `entity_changes` channel so every API worker
+-- can evict its in-process caches.
+CREATE OR REPLACE FUNCTION notify_entity_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSON;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data = row_to_json(OLD);
+    ELSE
+        row_data = row_to_json(NEW);
+    END IF;
+
+    PERFORM pg_notify(
+        'entity_changes',
+        json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', TG_OP,
+            'id', row_data->'id',
+            'user_id', row_data->'user_id',
+            'artist_id', row_data->'artist_id'
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_users_notify ON users;
+CREATE TRIGGER trigger_users_notify
+AFTER INSERT OR UPDATE OR DELETE ON users
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
+
+DROP TRIGGER IF EXISTS trigger_artist_notify ON artist;
+CREATE TRIGGER trigger_artist_notify
+AFTER INSERT OR UPDATE OR DELETE ON artist
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
+
+DROP TRIGGER IF EXISTS trigger_music_notify ON music;
+CREATE TRIGGER trigger_music_notify
+AFTER INSERT OR UPDATE OR DELETE ON music
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
@@ -0,0 +1,3 @@
+-- Per-artist listing and the ON DELETE CASCADE from artist both filter
+-- music by artist_id.
+CREATE INDEX IF NOT EXISTS music_artist_id_id_idx ON music (artist_id, id DESC);
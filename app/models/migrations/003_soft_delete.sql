@@ -0,0 +1,48 @@
+-- Soft delete: rows are hidden through deleted_at and removed later by the
+-- background purger in small batches.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE artist ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE music ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- A soft-deleted user must not block signing up again with the same email.
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_email_key;
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_active_idx ON users (email) WHERE deleted_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS users_deleted_idx ON users (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS artist_deleted_idx ON artist (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS music_deleted_idx ON music (deleted_at) WHERE deleted_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION notify_entity_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSON;
+    operation TEXT = TG_OP;
+BEGIN
+    -- Rows removed by the purger were announced when they were soft deleted.
+    IF current_setting('app.purging', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        row_data = row_to_json(OLD);
+    ELSE
+        row_data = row_to_json(NEW);
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        operation = 'DELETE';
+    END IF;
+
+    PERFORM pg_notify(
+        'entity_changes',
+        json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', operation,
+            'id', row_data->'id',
+            'user_id', row_data->'user_id',
+            'artist_id', row_data->'artist_id'
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
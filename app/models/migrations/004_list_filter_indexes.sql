@@ -0,0 +1,12 @@
+-- Indexes backing the filter and sort options of GET /api/music and
+-- GET /api/artist. B-tree indexes are scanned backwards for descending
+-- sorts, and (artist_id, id DESC) from 002 covers the artist_id filter
+-- with the default sort.
+CREATE INDEX IF NOT EXISTS music_genre_id_idx ON music (genre, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_genre_title_idx ON music (genre, title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_album_name_id_idx ON music (album_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_artist_id_title_idx ON music (artist_id, title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_title_id_idx ON music (title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS artist_first_release_year_idx ON artist (first_release_year, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_first_name_idx ON users (first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_last_name_idx ON users (last_name, id) WHERE deleted_at IS NULL;
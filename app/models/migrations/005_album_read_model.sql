@@ -0,0 +1,96 @@
+-- Album read model: one row per (artist_id, album_name) with aggregates over
+-- the artist's visible tracks, kept up to date by a trigger on music.
+CREATE INDEX IF NOT EXISTS music_artist_album_idx ON music (artist_id, album_name) WHERE deleted_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS album (
+  artist_id INTEGER NOT NULL REFERENCES artist(id) ON DELETE CASCADE,
+  album_name VARCHAR(255) NOT NULL,
+  track_count INTEGER NOT NULL,
+  genres genre_type[] NOT NULL,
+  first_added_at TIMESTAMP,
+  last_added_at TIMESTAMP,
+  PRIMARY KEY (artist_id, album_name)
+);
+
+CREATE OR REPLACE FUNCTION refresh_album(target_artist_id INTEGER, target_album_name VARCHAR)
+RETURNS VOID AS $$
+BEGIN
+    IF target_artist_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Concurrent writers to the same album take turns, so each recount sees
+    -- the tracks committed by the other.
+    PERFORM pg_advisory_xact_lock(target_artist_id, hashtext(target_album_name));
+
+    INSERT INTO album (artist_id, album_name, track_count, genres, first_added_at, last_added_at)
+    SELECT
+        target_artist_id,
+        target_album_name,
+        COUNT(*),
+        array_agg(DISTINCT genre ORDER BY genre),
+        MIN(created_at),
+        MAX(created_at)
+    FROM music
+    WHERE artist_id = target_artist_id
+      AND album_name = target_album_name
+      AND deleted_at IS NULL
+    HAVING COUNT(*) > 0
+    ON CONFLICT (artist_id, album_name) DO UPDATE SET
+        track_count = EXCLUDED.track_count,
+        genres = EXCLUDED.genres,
+        first_added_at = EXCLUDED.first_added_at,
+        last_added_at = EXCLUDED.last_added_at;
+
+    IF NOT FOUND THEN
+        DELETE FROM album
+        WHERE artist_id = target_artist_id AND album_name = target_album_name;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_music_album()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- The purger only removes rows that are already out of the album counts.
+    IF current_setting('app.purging', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND NEW.artist_id IS NOT DISTINCT FROM OLD.artist_id
+       AND NEW.album_name IS NOT DISTINCT FROM OLD.album_name
+       AND NEW.genre IS NOT DISTINCT FROM OLD.genre
+       AND NEW.deleted_at IS NOT DISTINCT FROM OLD.deleted_at THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_album(OLD.artist_id, OLD.album_name);
+    END IF;
+    IF TG_OP = 'INSERT'
+       OR (TG_OP = 'UPDATE' AND (NEW.artist_id, NEW.album_name) IS DISTINCT FROM (OLD.artist_id, OLD.album_name)) THEN
+        PERFORM refresh_album(NEW.artist_id, NEW.album_name);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_music_album ON music;
+CREATE TRIGGER trigger_music_album
+AFTER INSERT OR UPDATE OR DELETE ON music
+FOR EACH ROW
+EXECUTE FUNCTION refresh_music_album();
+
+INSERT INTO album (artist_id, album_name, track_count, genres, first_added_at, last_added_at)
+SELECT
+    artist_id,
+    album_name,
+    COUNT(*),
+    array_agg(DISTINCT genre ORDER BY genre),
+    MIN(created_at),
+    MAX(created_at)
+FROM music
+WHERE deleted_at IS NULL AND artist_id IS NOT NULL
+GROUP BY artist_id, album_name
+ON CONFLICT (artist_id, album_name) DO NOTHING;
@@ -0,0 +1,15 @@
+-- Revoked access tokens, kept until they would have expired anyway, and
+-- per-user cutoffs that revoke every token issued before a point in time.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  jti VARCHAR(64) PRIMARY KEY,
+  user_id INTEGER,
+  expires_at TIMESTAMP NOT NULL,
+  revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at_idx ON revoked_tokens (expires_at);
+
+CREATE TABLE IF NOT EXISTS token_cutoffs (
+  user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  revoked_before TIMESTAMP NOT NULL
+);
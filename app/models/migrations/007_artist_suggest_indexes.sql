@@ -0,0 +1,4 @@
+-- Prefix indexes for GET /api/artist/suggest. text_pattern_ops lets
+-- LIKE 'abc%' use the index whatever the database collation.
+CREATE INDEX IF NOT EXISTS users_first_name_prefix_idx ON users (lower(first_name) text_pattern_ops) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_last_name_prefix_idx ON users (lower(last_name) text_pattern_ops) WHERE deleted_at IS NULL;
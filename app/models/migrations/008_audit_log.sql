@@ -0,0 +1,15 @@
+-- Who changed which artist, track or user. Written in batches by the
+-- audit BatchWriter, so rows may land a moment after the change.
+CREATE TABLE IF NOT EXISTS audit_log (
+  id BIGSERIAL PRIMARY KEY,
+  actor_id INTEGER,
+  actor_role VARCHAR(32),
+  entity VARCHAR(32) NOT NULL,
+  entity_id INTEGER,
+  action VARCHAR(16) NOT NULL,
+  changes JSONB NOT NULL,
+  created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS audit_log_entity_idx ON audit_log (entity, entity_id, created_at);
+CREATE INDEX IF NOT EXISTS audit_log_actor_idx ON audit_log (actor_id, created_at);
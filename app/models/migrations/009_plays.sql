@@ -0,0 +1,38 @@
+-- Raw play events, appended in batches by the plays BatchWriter. No
+-- foreign keys: the table grows to hundreds of millions of rows and
+-- purged tracks keep their history.
+CREATE TABLE IF NOT EXISTS plays (
+  id BIGSERIAL PRIMARY KEY,
+  music_id INTEGER NOT NULL,
+  artist_id INTEGER NOT NULL,
+  genre genre_type NOT NULL,
+  user_id INTEGER,
+  played_at TIMESTAMP NOT NULL
+);
+
+-- Rows arrive roughly in played_at order, a BRIN index stays tiny.
+CREATE INDEX IF NOT EXISTS plays_played_at_brin_idx ON plays USING BRIN (played_at);
+
+-- Hourly rollups, updated in the same transaction as the COPY into plays.
+-- Charts only read these.
+CREATE TABLE IF NOT EXISTS play_hourly_track (
+  hour TIMESTAMP NOT NULL,
+  music_id INTEGER NOT NULL,
+  artist_id INTEGER NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, music_id)
+);
+
+CREATE TABLE IF NOT EXISTS play_hourly_artist (
+  hour TIMESTAMP NOT NULL,
+  artist_id INTEGER NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, artist_id)
+);
+
+CREATE TABLE IF NOT EXISTS play_hourly_genre (
+  hour TIMESTAMP NOT NULL,
+  genre genre_type NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, genre)
+);
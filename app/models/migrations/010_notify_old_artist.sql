@@ -0,0 +1,43 @@
+-- Music updates also publish the previous artist_id, so readers keeping
+-- per-artist state can fix up the artist a track moved away from.
+CREATE OR REPLACE FUNCTION notify_entity_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSON;
+    operation TEXT = TG_OP;
+    old_artist_id JSON;
+BEGIN
+    -- Rows removed by the purger were announced when they were soft deleted.
+    IF current_setting('app.purging', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        row_data = row_to_json(OLD);
+    ELSE
+        row_data = row_to_json(NEW);
+    END IF;
+
+    -- A track moved to another artist changes both artists.
+    IF TG_OP = 'UPDATE' THEN
+        old_artist_id = row_to_json(OLD)->'artist_id';
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        operation = 'DELETE';
+    END IF;
+
+    PERFORM pg_notify(
+        'entity_changes',
+        json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', operation,
+            'id', row_data->'id',
+            'user_id', row_data->'user_id',
+            'artist_id', row_data->'artist_id',
+            'old_artist_id', old_artist_id
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
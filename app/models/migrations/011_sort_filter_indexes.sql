@@ -0,0 +1,8 @@
+-- Composite indexes for GET /api/artist and GET /api/music when a filter
+-- is combined with a sort on another column. Artist name sorts read users
+-- in (name, id) order, restricted to the filtered gender or role.
+CREATE INDEX IF NOT EXISTS users_gender_first_name_idx ON users (gender, first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_gender_last_name_idx ON users (gender, last_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_role_first_name_idx ON users (role, first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_role_last_name_idx ON users (role, last_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_album_name_title_idx ON music (album_name, title, id) WHERE deleted_at IS NULL;
@@ -8,7 +8,7 @@ CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     first_name VARCHAR(255) NOT NULL,
     last_name VARCHAR(255) NOT NULL,
-    email VARCHAR(255) UNIQUE NOT NULL,
+    email VARCHAR(255) NOT NULL,
     password VARCHAR(500) NOT NULL,
     role role_type NOT NULL,
     phone  VARCHAR(20) NOT NULL,
@@ -16,16 +16,20 @@ CREATE TABLE IF NOT EXISTS users (
     gender gender_type NOT NULL,
     address VARCHAR(255) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_active_idx ON users (email) WHERE deleted_at IS NULL;
+
 CREATE TABLE IF NOT EXISTS artist (
   id SERIAL PRIMARY KEY,
   user_id INTEGER UNIQUE REFERENCES users(id) ON DELETE CASCADE,
   first_release_year INTEGER NOT NULL,
   no_of_albums_released INTEGER NOT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  deleted_at TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS music(
@@ -35,7 +39,102 @@ CREATE TABLE IF NOT EXISTS music(
   album_name VARCHAR(255) NOT NULL,
   genre genre_type NOT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  deleted_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS music_artist_id_id_idx ON music (artist_id, id DESC);
+
+CREATE INDEX IF NOT EXISTS users_deleted_idx ON users (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS artist_deleted_idx ON artist (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS music_deleted_idx ON music (deleted_at) WHERE deleted_at IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS music_genre_id_idx ON music (genre, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_genre_title_idx ON music (genre, title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_album_name_id_idx ON music (album_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_artist_id_title_idx ON music (artist_id, title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_title_id_idx ON music (title, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS artist_first_release_year_idx ON artist (first_release_year, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_first_name_idx ON users (first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_last_name_idx ON users (last_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_first_name_prefix_idx ON users (lower(first_name) text_pattern_ops) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_last_name_prefix_idx ON users (lower(last_name) text_pattern_ops) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_artist_album_idx ON music (artist_id, album_name) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_gender_first_name_idx ON users (gender, first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_gender_last_name_idx ON users (gender, last_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_role_first_name_idx ON users (role, first_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS users_role_last_name_idx ON users (role, last_name, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS music_album_name_title_idx ON music (album_name, title, id) WHERE deleted_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS album (
+  artist_id INTEGER NOT NULL REFERENCES artist(id) ON DELETE CASCADE,
+  album_name VARCHAR(255) NOT NULL,
+  track_count INTEGER NOT NULL,
+  genres genre_type[] NOT NULL,
+  first_added_at TIMESTAMP,
+  last_added_at TIMESTAMP,
+  PRIMARY KEY (artist_id, album_name)
+);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  jti VARCHAR(64) PRIMARY KEY,
+  user_id INTEGER,
+  expires_at TIMESTAMP NOT NULL,
+  revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at_idx ON revoked_tokens (expires_at);
+
+CREATE TABLE IF NOT EXISTS token_cutoffs (
+  user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  revoked_before TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS audit_log (
+  id BIGSERIAL PRIMARY KEY,
+  actor_id INTEGER,
+  actor_role VARCHAR(32),
+  entity VARCHAR(32) NOT NULL,
+  entity_id INTEGER,
+  action VARCHAR(16) NOT NULL,
+  changes JSONB NOT NULL,
+  created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS audit_log_entity_idx ON audit_log (entity, entity_id, created_at);
+CREATE INDEX IF NOT EXISTS audit_log_actor_idx ON audit_log (actor_id, created_at);
+
+CREATE TABLE IF NOT EXISTS plays (
+  id BIGSERIAL PRIMARY KEY,
+  music_id INTEGER NOT NULL,
+  artist_id INTEGER NOT NULL,
+  genre genre_type NOT NULL,
+  user_id INTEGER,
+  played_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS plays_played_at_brin_idx ON plays USING BRIN (played_at);
+
+CREATE TABLE IF NOT EXISTS play_hourly_track (
+  hour TIMESTAMP NOT NULL,
+  music_id INTEGER NOT NULL,
+  artist_id INTEGER NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, music_id)
+);
+
+CREATE TABLE IF NOT EXISTS play_hourly_artist (
+  hour TIMESTAMP NOT NULL,
+  artist_id INTEGER NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, artist_id)
+);
+
+CREATE TABLE IF NOT EXISTS play_hourly_genre (
+  hour TIMESTAMP NOT NULL,
+  genre genre_type NOT NULL,
+  plays BIGINT NOT NULL,
+  PRIMARY KEY (hour, genre)
 );
 
 
@@ -65,4 +164,133 @@ EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER trigger_music_updated_at
 BEFORE UPDATE ON music
 FOR EACH ROW
-EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+EXECUTE FUNCTION update_updated_at_column();
+
+-- Trigger function to publish row changes for cache invalidation and the
+-- change feed. Soft deletes are published as DELETE.
+CREATE OR REPLACE FUNCTION notify_entity_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSON;
+    operation TEXT = TG_OP;
+    old_artist_id JSON;
+BEGIN
+    -- Rows removed by the purger were announced when they were soft deleted.
+    IF current_setting('app.purging', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        row_data = row_to_json(OLD);
+    ELSE
+        row_data = row_to_json(NEW);
+    END IF;
+
+    -- A track moved to another artist changes both artists.
+    IF TG_OP = 'UPDATE' THEN
+        old_artist_id = row_to_json(OLD)->'artist_id';
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        operation = 'DELETE';
+    END IF;
+
+    PERFORM pg_notify(
+        'entity_changes',
+        json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', operation,
+            'id', row_data->'id',
+            'user_id', row_data->'user_id',
+            'artist_id', row_data->'artist_id',
+            'old_artist_id', old_artist_id
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_users_notify
+AFTER INSERT OR UPDATE OR DELETE ON users
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
+
+CREATE TRIGGER trigger_artist_notify
+AFTER INSERT OR UPDATE OR DELETE ON artist
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
+
+CREATE TRIGGER trigger_music_notify
+AFTER INSERT OR UPDATE OR DELETE ON music
+FOR EACH ROW
+EXECUTE FUNCTION notify_entity_change();
+
+-- Album read model, see models/migrations/005_album_read_model.sql.
+CREATE OR REPLACE FUNCTION refresh_album(target_artist_id INTEGER, target_album_name VARCHAR)
+RETURNS VOID AS $$
+BEGIN
+    IF target_artist_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Concurrent writers to the same album take turns, so each recount sees
+    -- the tracks committed by the other.
+    PERFORM pg_advisory_xact_lock(target_artist_id, hashtext(target_album_name));
+
+    INSERT INTO album (artist_id, album_name, track_count, genres, first_added_at, last_added_at)
+    SELECT
+        target_artist_id,
+        target_album_name,
+        COUNT(*),
+        array_agg(DISTINCT genre ORDER BY genre),
+        MIN(created_at),
+        MAX(created_at)
+    FROM music
+    WHERE artist_id = target_artist_id
+      AND album_name = target_album_name
+      AND deleted_at IS NULL
+    HAVING COUNT(*) > 0
+    ON CONFLICT (artist_id, album_name) DO UPDATE SET
+        track_count = EXCLUDED.track_count,
+        genres = EXCLUDED.genres,
+        first_added_at = EXCLUDED.first_added_at,
+        last_added_at = EXCLUDED.last_added_at;
+
+    IF NOT FOUND THEN
+        DELETE FROM album
+        WHERE artist_id = target_artist_id AND album_name = target_album_name;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_music_album()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- The purger only removes rows that are already out of the album counts.
+    IF current_setting('app.purging', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND NEW.artist_id IS NOT DISTINCT FROM OLD.artist_id
+       AND NEW.album_name IS NOT DISTINCT FROM OLD.album_name
+       AND NEW.genre IS NOT DISTINCT FROM OLD.genre
+       AND NEW.deleted_at IS NOT DISTINCT FROM OLD.deleted_at THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_album(OLD.artist_id, OLD.album_name);
+    END IF;
+    IF TG_OP = 'INSERT'
+       OR (TG_OP = 'UPDATE' AND (NEW.artist_id, NEW.album_name) IS DISTINCT FROM (OLD.artist_id, OLD.album_name)) THEN
+        PERFORM refresh_album(NEW.artist_id, NEW.album_name);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_music_album
+AFTER INSERT OR UPDATE OR DELETE ON music
+FOR EACH ROW
+EXECUTE FUNCTION refresh_music_album();
@@ -1,17 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends, Path, Query, File, UploadFile
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    Path,
+    Query,
+    File,
+    UploadFile,
+    Request,
+    Response,
+)
+import asyncio
 import csv, os
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Literal, Optional
 from datetime import datetime
 from auth.jwt import decode_access_token
 from schemas.artist import (
     ArtistCreate,
+    ArtistFullOut,
     ArtistOut,
+    ArtistSort,
     ArtistUpdate,
+    Gender,
     PaginatedArtistResponse,
+    Role,
+    SimilarArtistsResponse,
 )
 from middlewares.user_check import is_superadmin, is_manager, is_artist
 from services.artist import (
+    ARTIST_FIELD_COLUMNS,
     create_artist,
     get_artist_by_id,
     get_artists_count,
@@ -19,28 +37,118 @@ from services.artist import (
     update_artist,
     delete_artist,
     get_all_artists_without_pagination,
+    get_artist_updated_at,
+    get_artists_by_ids,
+    get_artist_with_music,
+    suggest_artists,
 )
+from services.album import get_albums_by_artist_id, get_albums_by_artist_count
+from schemas.album import AlbumOut, PaginatedAlbumResponse
+from services.audit import record_change
+from services.similar_artists import get_similar_artists
 from utils.bulk_create_artists_from_csv import bulk_create_artists_from_csv
+from utils.deadline import run_until_deadline
+from utils.single_flight import scope_key, single_flight
+from utils.batch import batch_response, parse_ids
+from utils.fields import parse_fields
+from utils.conditional import (
+    PreconditionFailed,
+    cache_headers,
+    check_if_match,
+    has_conditional_headers,
+    is_not_modified,
+)
 from pathlib import Path as OsPath
+from config import (
+    DOWNLOAD_DEADLINE_SECONDS,
+    LIST_DEADLINE_SECONDS,
+    UPLOAD_DEADLINE_SECONDS,
+)
 
 
 router = APIRouter()
 
 
 @router.post("/artist", response_model=ArtistOut)
-async def create(artist: ArtistCreate):
+async def create(
+    artist: ArtistCreate, userInfo: dict = Depends(decode_access_token)
+):
     artist = await create_artist(artist)
+    record_change(userInfo, "artist", artist["id"], "create", after=artist)
     return dict(artist)
 
 
 @router.get("/artist", response_model=PaginatedArtistResponse)
 async def list(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, le=100),
+    first_release_year_from: Optional[int] = None,
+    first_release_year_to: Optional[int] = None,
+    gender: Optional[Gender] = None,
+    role: Optional[Role] = None,
+    sort: ArtistSort = "-id",
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    include: Optional[Literal["music"]] = None,
+    music_limit: int = Query(5, ge=1, le=50),
+    userInfo: dict = Depends(decode_access_token),
 ):
-    rows = await get_all_artist(page, page_size)
-    total_artist = await get_artists_count()
+    columns = parse_fields(fields, ARTIST_FIELD_COLUMNS)
+    batch_ids = parse_ids(ids)
+    if batch_ids is not None:
+        if not is_superadmin(userInfo) and not is_manager(userInfo):
+            raise HTTPException(
+                status_code=403, detail="You are not allowed to access this resource"
+            )
+        artists = await get_artists_by_ids(batch_ids)
+        return batch_response(
+            "artists", batch_ids, artists, columns or [*ARTIST_FIELD_COLUMNS]
+        )
+
+    filters = {
+        "first_release_year_from": first_release_year_from,
+        "first_release_year_to": first_release_year_to,
+        "gender": gender,
+        "role": role,
+    }
+    music_limit = music_limit if include == "music" else None
+    key = (
+        "artist_list",
+        page,
+        page_size,
+        tuple(filters.items()),
+        sort,
+        tuple(columns or ()),
+        music_limit,
+        scope_key(userInfo),
+    )
+    rows, total_artist = await run_until_deadline(
+        request,
+        LIST_DEADLINE_SECONDS,
+        lambda: single_flight.do(
+            key,
+            lambda: asyncio.gather(
+                get_all_artist(page, page_size, filters, sort, columns, music_limit),
+                get_artists_count(filters),
+            ),
+        ),
+    )
     total_pages = (total_artist + page_size - 1) // page_size
+    if columns or include:
+        # Partial rows and embedded tracks do not fit ArtistOut, send them as
+        # they come.
+        return JSONResponse(
+            jsonable_encoder(
+                {
+                    "page": page,
+                    "page_size": page_size,
+                    "total_artist": total_artist,
+                    "total_pages": total_pages,
+                    "artists": [dict(row) for row in rows],
+                }
+            )
+        )
     artists = []
     if rows:
         for row in rows:
@@ -74,11 +182,28 @@ async def list(
     )
 
 
+@router.get("/artist/suggest")
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    rows = await suggest_artists(q, limit)
+    return [
+        {
+            "value": str(row["artist_id"]),
+            "label": f"{row['first_name']} {row['last_name']}",
+        }
+        for row in rows
+    ]
+
+
 @router.get(
     "/artist/{artist_id}",
     response_model=ArtistOut,
 )
 async def get_artist(
+    request: Request,
+    response: Response,
     artist_id: int = Path(..., ge=1),
     userInfo: dict = Depends(decode_access_token),
 ):
@@ -86,23 +211,136 @@ async def get_artist(
         raise HTTPException(
             status_code=403, detail="You are not allowed to access this resource"
         )
+    if has_conditional_headers(request):
+        updated_at = await get_artist_updated_at(artist_id)
+        if not updated_at:
+            raise HTTPException(status_code=404, detail="Artist not found")
+        headers = cache_headers("artist", artist_id, updated_at)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
     artist = await get_artist_by_id(artist_id)
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
 
     artist = dict(artist)
+    response.headers.update(
+        cache_headers(
+            "artist",
+            artist_id,
+            max(artist["updated_at"], artist["user_updated_at"]),
+        )
+    )
     artist["created_at"] = str(artist["created_at"])
     artist["updated_at"] = str(artist["updated_at"])
     return ArtistOut(**artist)
 
 
+@router.get("/artist/{artist_id}/full", response_model=ArtistFullOut)
+async def get_artist_full(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, le=100),
+    artist_id: int = Path(..., ge=1),
+    userInfo: dict = Depends(decode_access_token),
+):
+    if not is_superadmin(userInfo) and not is_manager(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    artist = await get_artist_with_music(artist_id, page, page_size)
+    if not artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+
+    total_pages = (artist["total_music"] + page_size - 1) // page_size
+    return ArtistFullOut(
+        **artist, page=page, page_size=page_size, total_pages=total_pages
+    )
+
+
+@router.get("/artist/{artist_id}/albums", response_model=PaginatedAlbumResponse)
+async def get_albums(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, le=100),
+    artist_id: int = Path(..., ge=1),
+    userInfo: dict = Depends(decode_access_token),
+):
+    artist = await get_artist_by_id(artist_id)
+    if not artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+
+    rows = await get_albums_by_artist_id(artist_id, page, page_size)
+    total_albums = await get_albums_by_artist_count(artist_id)
+    total_pages = (total_albums + page_size - 1) // page_size
+    return PaginatedAlbumResponse(
+        page=page,
+        page_size=page_size,
+        total_albums=total_albums,
+        total_pages=total_pages,
+        albums=[AlbumOut(**dict(row)) for row in rows],
+    )
+
+
+@router.get("/artist/{artist_id}/similar", response_model=SimilarArtistsResponse)
+async def get_similar(
+    artist_id: int = Path(..., ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    era_weight: float = Query(0.0, ge=0.0, le=1.0),
+):
+    similar = await get_similar_artists(artist_id, limit, era_weight)
+    if similar is None:
+        raise HTTPException(
+            status_code=404, detail="Artist not found or has no music"
+        )
+    artists = await get_artists_by_ids([row["artist_id"] for row in similar])
+    return {
+        "artist_id": artist_id,
+        "era_weight": era_weight,
+        "similar": [
+            {
+                **row,
+                "first_name": artists[row["artist_id"]]["first_name"],
+                "last_name": artists[row["artist_id"]]["last_name"],
+                "first_release_year": artists[row["artist_id"]]["first_release_year"],
+            }
+            for row in similar
+            if row["artist_id"] in artists
+        ],
+    }
+
+
 @router.put("/artist/{artist_id}", response_model=ArtistOut)
-async def update(artist_id: int = Path(..., ge=1), artist: ArtistUpdate = ...):
-    existing_artist = await get_artist_by_id(artist_id)
-    if not existing_artist:
+async def update(
+    request: Request,
+    response: Response,
+    artist_id: int = Path(..., ge=1),
+    artist: ArtistUpdate = ...,
+    userInfo: dict = Depends(decode_access_token),
+):
+    updated_at = await get_artist_updated_at(artist_id)
+    if not updated_at:
         raise HTTPException(status_code=404, detail="Artist not found")
+    expected_updated_at = None
+    if "if-match" in request.headers:
+        check_if_match(request, cache_headers("artist", artist_id, updated_at)["ETag"])
+        expected_updated_at = updated_at
 
-    updated_artist = await update_artist(artist_id, artist)
+    try:
+        before, updated_artist = await update_artist(artist_id, artist, expected_updated_at)
+    except PreconditionFailed:
+        raise HTTPException(
+            status_code=412, detail="Resource has been modified by another request"
+        )
+    if updated_artist is None:
+        # Deleted between the precondition read and the locked update.
+        raise HTTPException(status_code=404, detail="Artist not found")
+    record_change(userInfo, "artist", artist_id, "update", before, updated_artist)
+    response.headers.update(
+        cache_headers(
+            "artist",
+            artist_id,
+            max(updated_artist["updated_at"], updated_artist["user_updated_at"]),
+        )
+    )
     updated_artist["created_at"] = str(updated_artist["created_at"])
     updated_artist["updated_at"] = str(updated_artist["updated_at"])
 
@@ -122,10 +360,12 @@ async def delete(
     if not existing_artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     await delete_artist(artist_id)
+    record_change(userInfo, "artist", artist_id, "delete", before=existing_artist)
 
 
 @router.post("/artist/upload-csv", response_model=List[ArtistOut])
 async def create_artists_from_csv(
+    request: Request,
     file: UploadFile = File(...),
     userInfo: dict = Depends(decode_access_token),
 ):
@@ -137,7 +377,11 @@ async def create_artists_from_csv(
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
     try:
-        artists = await bulk_create_artists_from_csv(file)
+        artists = await run_until_deadline(
+            request,
+            UPLOAD_DEADLINE_SECONDS,
+            lambda: bulk_create_artists_from_csv(file),
+        )
         flattened_artists = []
         for artist in artists:
             flattened_artists.append(
@@ -161,16 +405,22 @@ async def create_artists_from_csv(
                 }
             )
 
+        for artist in flattened_artists:
+            record_change(userInfo, "artist", artist["id"], "create", after=artist)
         return flattened_artists
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/artists/download")
-async def download_artists():
+async def download_artists(request: Request):
 
-    artists = await get_all_artists_without_pagination()
+    artists = await run_until_deadline(
+        request, DOWNLOAD_DEADLINE_SECONDS, get_all_artists_without_pagination
+    )
 
     if not artists:
         return JSONResponse({"detail": "No artists found"}, status_code=404)
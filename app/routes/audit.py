@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth.jwt import decode_access_token
+from middlewares.user_check import is_superadmin
+from services.audit import audit_log
+
+
+router = APIRouter()
+
+
+@router.get("/audit/stats")
+async def get_audit_stats(userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    return audit_log.stats()
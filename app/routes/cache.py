@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth.jwt import decode_access_token
+from middlewares.user_check import is_superadmin
+from utils.cache import cache_stats
+from utils.single_flight import single_flight
+from services.similar_artists import similar_artists
+
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    return {
+        "caches": cache_stats(),
+        "single_flight": single_flight.stats(),
+        "similar_artists": similar_artists.stats(),
+    }
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Query
+from schemas.charts import ChartBy, ChartResponse, ChartWindow
+from services.charts import get_top_chart
+
+
+router = APIRouter()
+
+
+@router.get("/charts/top", response_model=ChartResponse)
+async def top(
+    by: ChartBy = Query("track"),
+    window: ChartWindow = Query("24h"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    since, rows = await get_top_chart(by, window, limit)
+    return {
+        "by": by,
+        "window": window,
+        "since": since,
+        "entries": [dict(row) for row in rows],
+    }
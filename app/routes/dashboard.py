@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth.jwt import decode_access_token
+from middlewares.user_check import is_superadmin, is_manager
+from schemas.dashboard import DashboardSummary
+from services.dashboard import get_dashboard_summary
+
+
+router = APIRouter()
+
+
+@router.get("/dashboard/summary", response_model=DashboardSummary)
+async def summary(userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo) and not is_manager(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    return await get_dashboard_summary()
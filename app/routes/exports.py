@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth.jwt import decode_access_token
+from middlewares.compression import skip_compression
+from middlewares.user_check import is_superadmin
+from utils.private_files import list_files, private_file
+from config import EXPORT_DIR
+
+
+router = APIRouter()
+
+
+def require_superadmin(userInfo: dict):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+
+
+@router.get("/exports")
+async def get_exports(userInfo: dict = Depends(decode_access_token)):
+    require_superadmin(userInfo)
+    return {"exports": list_files(EXPORT_DIR, ".tar")}
+
+
+@router.get("/exports/{name}")
+@skip_compression
+async def download_export(name: str, userInfo: dict = Depends(decode_access_token)):
+    require_superadmin(userInfo)
+    return private_file(EXPORT_DIR, name, "application/x-tar")
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, Path, Query
-from auth.jwt import decode_access_token
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from auth.jwt import create_stream_token, decode_access_token, decode_stream_token
+from typing import List, Optional, Union
 from schemas.music import (
+    Genre,
     MusicCreate,
     MusicOut,
+    MusicSort,
     MusicUpdate,
     PaginatedMusicResponse,
 )
+from schemas.charts import PlayEvent, PlaysAccepted
+from middlewares.compression import skip_compression
 from middlewares.user_check import is_superadmin, is_manager, is_artist
 from services.music import (
+    MUSIC_FIELD_COLUMNS,
     create_music,
     get_music_by_id,
     get_music_by_artist_id,
@@ -17,12 +27,35 @@ from services.music import (
     update_music,
     delete_music,
     get_music_by_artist_count,
-    get_music_by_user_id,
+    get_music_updated_at,
+    get_music_by_ids,
 )
 from services.artist import get_artist_by_user_id
+from services.audit import record_change
+from services.plays import play_log, play_time, record_plays, utc_naive
+from utils.change_feed import change_feed
+from utils.deadline import run_until_deadline
+from utils.single_flight import scope_key, single_flight
+from utils.batch import batch_response, parse_ids
+from utils.fields import parse_fields
+from config import (
+    CHANGE_FEED_KEEPALIVE_SECONDS,
+    LIST_DEADLINE_SECONDS,
+    PLAYS_MAX_EVENTS,
+    STREAM_TOKEN_EXPIRE_SECONDS,
+)
+from utils.conditional import (
+    PreconditionFailed,
+    cache_headers,
+    check_if_match,
+    has_conditional_headers,
+    is_not_modified,
+)
 
 
 router = APIRouter()
+# Authenticates per route, see decode_stream_token.
+changes_router = APIRouter()
 
 
 @router.post("/music", response_model=MusicOut)
@@ -33,43 +66,122 @@ async def create(music: MusicCreate, userInfo: dict = Depends(decode_access_toke
         artist_id = row[0]
         music.artist_id = artist_id
     music = await create_music(music)
+    record_change(userInfo, "music", music["id"], "create", after=music)
     return dict(music)
 
 
+@router.post("/music/plays", response_model=PlaysAccepted, status_code=202)
+async def plays(
+    events: Union[PlayEvent, List[PlayEvent]],
+    userInfo: dict = Depends(decode_access_token),
+):
+    if isinstance(events, PlayEvent):
+        events = [events]
+    if not events:
+        raise HTTPException(status_code=400, detail="No play events given")
+    if len(events) > PLAYS_MAX_EVENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {PLAYS_MAX_EVENTS} play events per request",
+        )
+    # Artist and genre are denormalized onto every play; the lookup is
+    # served from the music cache for hot tracks.
+    tracks = await get_music_by_ids(sorted({event.music_id for event in events}))
+    now = utc_naive()
+    known = []
+    rejected = []
+    for index, event in enumerate(events):
+        played_at = play_time(event.played_at, now)
+        if played_at is None:
+            rejected.append(index)
+        elif event.music_id in tracks:
+            known.append((event.music_id, played_at))
+    accepted = record_plays(userInfo["id"], known, tracks)
+    if known and not accepted:
+        raise HTTPException(
+            status_code=503,
+            detail="Play events are not being accepted right now, retry later",
+            headers={"Retry-After": "1"},
+        )
+    return {
+        "accepted": accepted,
+        "dropped": len(known) - accepted,
+        "missing": sorted({e.music_id for e in events if e.music_id not in tracks}),
+        "rejected": rejected,
+    }
+
+
+@router.get("/music/plays/stats")
+async def plays_stats(userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    return play_log.stats()
+
+
 @router.get("/music", response_model=PaginatedMusicResponse)
 async def list(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, le=100),
+    genre: Optional[Genre] = None,
+    album_name: Optional[str] = None,
+    artist_id: Optional[int] = Query(None, ge=1),
+    sort: MusicSort = "-id",
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
     userInfo: dict = Depends(decode_access_token),
 ):
-    if userInfo["role"] == "artist":
-        rows = await get_music_by_user_id(userInfo["id"], page, page_size)
-        total_music = len(rows)
-        total_pages = (total_music + page_size - 1) // page_size
-        music = []
-        for row in rows:
-            music.append(
-                MusicOut(
-                    id=row[0],
-                    artist_id=row[1],
-                    title=str(row[2]),
-                    album_name=row[3],
-                    genre=row[4],
-                    created_at=str(row[5]),
-                    updated_at=str(row[6]),
-                )
-            )
-        return PaginatedMusicResponse(
-            page=page,
-            page_size=page_size,
-            total_music=total_music,
-            total_pages=total_pages,
-            music=music,
+    columns = parse_fields(fields, MUSIC_FIELD_COLUMNS)
+    batch_ids = parse_ids(ids)
+    if batch_ids is not None:
+        music = await get_music_by_ids(batch_ids)
+        return batch_response(
+            "music", batch_ids, music, columns or [*MUSIC_FIELD_COLUMNS]
         )
 
-    rows = await get_all_music(page, page_size)
-    total_music = await get_music_count()
+    filters = {"genre": genre, "album_name": album_name, "artist_id": artist_id}
+    if is_artist(userInfo):
+        row = await get_artist_by_user_id(userInfo["id"])
+        if not row:
+            raise HTTPException(status_code=404, detail="Artist not found")
+        filters["artist_id"] = row["id"]
+
+    key = (
+        "music_list",
+        page,
+        page_size,
+        tuple(filters.items()),
+        sort,
+        tuple(columns or ()),
+        scope_key(userInfo),
+    )
+    rows, total_music = await run_until_deadline(
+        request,
+        LIST_DEADLINE_SECONDS,
+        lambda: single_flight.do(
+            key,
+            lambda: asyncio.gather(
+                get_all_music(page, page_size, filters, sort, columns),
+                get_music_count(filters),
+            ),
+        ),
+    )
     total_pages = (total_music + page_size - 1) // page_size
+    if columns:
+        # Partial rows do not fit MusicOut, send them as they come.
+        return JSONResponse(
+            jsonable_encoder(
+                {
+                    "page": page,
+                    "page_size": page_size,
+                    "total_music": total_music,
+                    "total_pages": total_pages,
+                    "music": [dict(row) for row in rows],
+                }
+            )
+        )
     music = []
     for row in rows:
         music.append(
@@ -93,7 +205,11 @@ async def list(
 
 
 @router.get("/music/page-data")
-async def page_data():
+async def page_data(include_artists: bool = True):
+    # Forms that use /api/artist/suggest can skip the full artist list.
+    if not include_artists:
+        return {"genre": ["rnb", "country", "classic", "rock", "jazz"]}
+
     rows = await get_music_page_data()
     rows = [dict(row) for row in rows]
 
@@ -108,15 +224,85 @@ async def page_data():
     return {"genre": ["rnb", "country", "classic", "rock", "jazz"], "artists": rows}
 
 
+def is_visible_change(event: dict, artist_id: int):
+    if artist_id is None or event["op"] == "RESYNC":
+        return True
+    if event["table"] == "artist":
+        return event["id"] == artist_id
+    return artist_id in (event["artist_id"], event.get("old_artist_id"))
+
+
+@router.post("/music/changes/token")
+async def music_changes_token(userInfo: dict = Depends(decode_access_token)):
+    return {
+        "token": create_stream_token(userInfo),
+        "expires_in": STREAM_TOKEN_EXPIRE_SECONDS,
+    }
+
+
+@changes_router.get("/music/changes")
+@skip_compression
+async def music_changes(
+    request: Request,
+    userInfo: dict = Depends(decode_stream_token),
+):
+    artist_id = None
+    if is_artist(userInfo):
+        row = await get_artist_by_user_id(userInfo.get("id"))
+        if not row:
+            raise HTTPException(status_code=404, detail="Artist not found")
+        artist_id = row["id"]
+
+    async def stream():
+        # Subscribed only once the response is iterated, so a request that
+        # never starts streaming leaves no queue behind.
+        subscription = change_feed.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), timeout=CHANGE_FEED_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if subscription.dropped:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                if is_visible_change(event, artist_id):
+                    yield f"event: {event['op'].lower()}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/music/artist/{artist_id}", response_model=PaginatedMusicResponse)
 async def get_music_by_artist(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, le=100),
     artist_id: int = Path(..., ge=1),
     userInfo: dict = Depends(decode_access_token),
 ):
-    rows = await get_music_by_artist_id(artist_id, page, page_size)
-    total_music = await get_music_by_artist_count(artist_id)
+    key = ("music_by_artist", artist_id, page, page_size, scope_key(userInfo))
+    rows, total_music = await run_until_deadline(
+        request,
+        LIST_DEADLINE_SECONDS,
+        lambda: single_flight.do(
+            key,
+            lambda: asyncio.gather(
+                get_music_by_artist_id(artist_id, page, page_size),
+                get_music_by_artist_count(artist_id),
+            ),
+        ),
+    )
     total_pages = (total_music + page_size - 1) // page_size
     music = []
     if rows:
@@ -143,6 +329,8 @@ async def get_music_by_artist(
 
 @router.put("/music/{music_id}", response_model=MusicOut)
 async def update(
+    request: Request,
+    response: Response,
     music_id: int = Path(..., ge=1),
     userInfo: dict = Depends(decode_access_token),
     music: MusicUpdate = ...,
@@ -154,11 +342,27 @@ async def update(
         artist_id = row[0]
         music.artist_id = artist_id
 
-    existing_music = await get_music_by_id(music_id)
-    if not existing_music:
+    updated_at = await get_music_updated_at(music_id)
+    if not updated_at:
         raise HTTPException(status_code=404, detail="Music not found")
+    expected_updated_at = None
+    if "if-match" in request.headers:
+        check_if_match(request, cache_headers("music", music_id, updated_at)["ETag"])
+        expected_updated_at = updated_at
 
-    updated_music = await update_music(music_id, music)
+    try:
+        before, updated_music = await update_music(music_id, music, expected_updated_at)
+    except PreconditionFailed:
+        raise HTTPException(
+            status_code=412, detail="Resource has been modified by another request"
+        )
+    if updated_music is None:
+        # Deleted between the precondition read and the locked update.
+        raise HTTPException(status_code=404, detail="Music not found")
+    record_change(userInfo, "music", music_id, "update", before, updated_music)
+    response.headers.update(
+        cache_headers("music", music_id, updated_music["updated_at"])
+    )
     updated_music["created_at"] = str(updated_music["created_at"])
     updated_music["updated_at"] = str(updated_music["updated_at"])
 
@@ -170,14 +374,25 @@ async def update(
     response_model=MusicOut,
 )
 async def get_artist(
+    request: Request,
+    response: Response,
     music_id: int = Path(..., ge=1),
     userInfo: dict = Depends(decode_access_token),
 ):
+    if has_conditional_headers(request):
+        updated_at = await get_music_updated_at(music_id)
+        if not updated_at:
+            raise HTTPException(status_code=404, detail="Music not found")
+        headers = cache_headers("music", music_id, updated_at)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
     music = await get_music_by_id(music_id)
     if not music:
         raise HTTPException(status_code=404, detail="Music not found")
 
     music = dict(music)
+    response.headers.update(cache_headers("music", music_id, music["updated_at"]))
     music["created_at"] = str(music["created_at"])
     music["updated_at"] = str(music["updated_at"])
     return MusicOut(**music)
@@ -201,4 +416,5 @@ async def delete(
                 status_code=403, detail="You are not authorized to delete this music"
             )
 
-    await delete_music(music_id)
+    await delete_music(music_id, existing_music["artist_id"])
+    record_change(userInfo, "music", music_id, "delete", before=existing_music)
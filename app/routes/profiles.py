@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth.jwt import decode_access_token
+from middlewares.user_check import is_superadmin
+from utils.private_files import list_files, private_file
+from config import PROFILE_DIR
+
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+async def get_profiles(userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    return {"profiles": list_files(PROFILE_DIR, ".json")}
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str, userInfo: dict = Depends(decode_access_token)):
+    if not is_superadmin(userInfo):
+        raise HTTPException(
+            status_code=403, detail="You are not allowed to access this resource"
+        )
+    if not name.endswith((".json", ".folded")):
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = "application/json" if name.endswith(".json") else "text/plain"
+    return private_file(PROFILE_DIR, name, media_type)
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+
+class AlbumOut(BaseModel):
+    artist_id: int
+    album_name: str
+    track_count: int
+    genres: List[str]
+    first_added_at: Optional[datetime]
+    last_added_at: Optional[datetime]
+
+
+class PaginatedAlbumResponse(BaseModel):
+    page: int
+    page_size: int
+    total_albums: int
+    total_pages: int
+    albums: List[AlbumOut]
@@ -1,6 +1,20 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Literal
+from schemas.music import MusicOut
+
+Gender = Literal["male", "female", "other"]
+Role = Literal["super_admin", "artist_manager", "artist"]
+ArtistSort = Literal[
+    "id",
+    "-id",
+    "first_release_year",
+    "-first_release_year",
+    "first_name",
+    "-first_name",
+    "last_name",
+    "-last_name",
+]
 
 
 class ArtistBase(BaseModel):
@@ -25,6 +39,29 @@ class ArtistOut(ArtistBase):
     user_updated_at: datetime
 
 
+class ArtistFullOut(ArtistOut):
+    page: int
+    page_size: int
+    total_music: int
+    total_pages: int
+    music: List[MusicOut]
+
+
+class SimilarArtistOut(BaseModel):
+    artist_id: int
+    first_name: str
+    last_name: str
+    first_release_year: int
+    score: float
+    genres: Dict[str, int]
+
+
+class SimilarArtistsResponse(BaseModel):
+    artist_id: int
+    era_weight: float
+    similar: List[SimilarArtistOut]
+
+
 class ArtistCreate(ArtistBase):
     pass
 
@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal, Optional
+
+ChartBy = Literal["track", "artist", "genre"]
+ChartWindow = Literal["1h", "24h", "7d", "30d"]
+
+
+class PlayEvent(BaseModel):
+    music_id: int = Field(..., ge=1, le=2147483647)
+    played_at: Optional[datetime] = None
+
+
+class PlaysAccepted(BaseModel):
+    accepted: int
+    dropped: int
+    missing: List[int]
+    # Positions in the request of events whose played_at was out of range.
+    rejected: List[int]
+
+
+class ChartResponse(BaseModel):
+    by: ChartBy
+    window: ChartWindow
+    since: datetime
+    entries: List[dict]
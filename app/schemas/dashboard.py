@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict
+
+
+class DashboardSummary(BaseModel):
+    total_users: int
+    total_artists: int
+    total_music: int
+    users_by_role: Dict[str, int]
+    music_by_genre: Dict[str, int]
+    generated_at: datetime
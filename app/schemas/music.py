@@ -1,6 +1,9 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Literal
+
+Genre = Literal["rnb", "country", "classic", "rock", "jazz"]
+MusicSort = Literal["id", "-id", "title", "-title"]
 
 
 class MusicBase(BaseModel):
@@ -0,0 +1,52 @@
+from db.database import connect_db
+from utils.cache import artist_cache
+
+
+async def get_albums_by_artist_id(artist_id: int, page: int, page_size: int):
+    conn = await connect_db()
+    try:
+        offset = (page - 1) * page_size
+        query = """
+            SELECT artist_id, album_name, track_count, genres, first_added_at, last_added_at
+            FROM album
+            WHERE artist_id = $1
+            ORDER BY last_added_at DESC NULLS LAST, album_name
+            LIMIT $2 OFFSET $3
+        """
+        return await conn.fetch(query, artist_id, page_size, offset)
+    finally:
+        await conn.close()
+
+
+async def get_albums_by_artist_count(artist_id: int):
+    conn = await connect_db()
+    try:
+        return await conn.fetchval(
+            "SELECT COUNT(*) FROM album WHERE artist_id = $1", artist_id
+        )
+    finally:
+        await conn.close()
+
+
+async def sync_album_counts(conn, artist_ids: list):
+    # Copies the album counts onto artist.no_of_albums_released, touching
+    # only the artists whose count actually changed.
+    rows = await conn.fetch(
+        """
+        UPDATE artist
+        SET no_of_albums_released = counts.albums
+        FROM (
+            SELECT artist_ids.id, COUNT(album.artist_id) AS albums
+            FROM unnest($1::int[]) AS artist_ids(id)
+            LEFT JOIN album ON album.artist_id = artist_ids.id
+            GROUP BY artist_ids.id
+        ) AS counts
+        WHERE artist.id = counts.id
+          AND artist.no_of_albums_released <> counts.albums
+        RETURNING artist.id
+        """,
+        [artist_id for artist_id in set(artist_ids) if artist_id is not None],
+    )
+    for row in rows:
+        artist_cache.evict(row["id"])
+    return len(rows)
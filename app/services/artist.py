@@ -1,8 +1,21 @@
+import json
+from datetime import datetime
 from db.database import connect_db
 from schemas.artist import (
     ArtistCreate,
     ArtistUpdate,
 )
+from utils.conditional import PreconditionFailed
+from utils.cache import (
+    artist_cache,
+    artist_by_user_cache,
+    artist_suggest_cache,
+    music_cache,
+    user_cache,
+)
+from utils.fields import select_list
+from services.purger import purger
+from config import SOFT_DELETE
 
 
 async def create_artist(artist_data: ArtistCreate):
@@ -58,6 +71,10 @@ async def create_artist(artist_data: ArtistCreate):
 
 
 async def get_artist_by_id(id: int):
+    cached = artist_cache.get(id)
+    if cached is not None:
+        return cached
+    version = artist_cache.version()
     conn = await connect_db()
     try:
         query = """
@@ -82,44 +99,218 @@ async def get_artist_by_id(id: int):
 
             FROM artist
             JOIN users ON users.id = artist.user_id
-            WHERE artist.id = $1
+            WHERE artist.id = $1 AND artist.deleted_at IS NULL
         """
-        return await conn.fetchrow(query, id)
+        artist = await conn.fetchrow(query, id)
+        artist_cache.set(id, artist, version)
+        return artist
     finally:
         await conn.close()
 
 
-async def get_artists_count():
+async def get_artists_by_ids(ids: list):
+    artists = {}
+    for id in ids:
+        cached = artist_cache.get(id)
+        if cached is not None:
+            artists[id] = cached
+    missing = [id for id in ids if id not in artists]
+    if not missing:
+        return artists
+    version = artist_cache.version()
     conn = await connect_db()
     try:
-        return await conn.fetchval("SELECT COUNT(*) FROM artist")
+        rows = await conn.fetch(
+            f"""
+            SELECT {select_list(ARTIST_FIELD_COLUMNS)}
+            FROM artist
+            JOIN users ON users.id = artist.user_id
+            WHERE artist.id = ANY($1::int[]) AND artist.deleted_at IS NULL
+            """,
+            missing,
+        )
+        for row in rows:
+            artist_cache.set(row["id"], row, version)
+            artists[row["id"]] = row
+        return artists
     finally:
         await conn.close()
 
 
-async def get_all_artist(page: int, page_size: int):
+async def get_artist_updated_at(id: int):
     conn = await connect_db()
     try:
-        offset = (page - 1) * page_size
-        query = """
-            SELECT 
-                artist.*,
-                users.first_name,
-                users.last_name,
-                users.email,
-                users.phone,
-                users.dob,
-                users.gender,
-                users.address,
-                users.role,
-                users.created_at AS user_created_at,
-                users.updated_at AS user_updated_at
+        return await conn.fetchval(
+            """
+            SELECT GREATEST(artist.updated_at, users.updated_at)
             FROM artist
+            JOIN users ON users.id = artist.user_id
+            WHERE artist.id = $1 AND artist.deleted_at IS NULL
+            """,
+            id,
+        )
+    finally:
+        await conn.close()
+
+
+ARTIST_FIELD_COLUMNS = {
+    "id": "artist.id",
+    "user_id": "artist.user_id",
+    "first_release_year": "artist.first_release_year",
+    "no_of_albums_released": "artist.no_of_albums_released",
+    "created_at": "artist.created_at",
+    "updated_at": "artist.updated_at",
+    "first_name": "users.first_name",
+    "last_name": "users.last_name",
+    "email": "users.email",
+    "phone": "users.phone",
+    "dob": "users.dob",
+    "gender": "users.gender",
+    "address": "users.address",
+    "role": "users.role",
+    "user_created_at": "users.created_at",
+    "user_updated_at": "users.updated_at",
+}
+ARTIST_SORT_COLUMNS = {
+    "id": "artist.id",
+    "first_release_year": "artist.first_release_year",
+    "first_name": "users.first_name",
+    "last_name": "users.last_name",
+}
+
+
+def artist_conditions(filters: dict, values: list, join_users: bool = False):
+    # Only fixed column names reach the SQL text, values are always bound.
+    conditions = ["artist.deleted_at IS NULL"]
+    filters = filters or {}
+    if join_users or filters.get("gender") is not None or filters.get("role") is not None:
+        # Matches the predicate of the partial users indexes.
+        conditions.append("users.deleted_at IS NULL")
+    for key, condition in (
+        ("first_release_year_from", "artist.first_release_year >= ${}"),
+        ("first_release_year_to", "artist.first_release_year <= ${}"),
+        ("gender", "users.gender = ${}"),
+        ("role", "users.role = ${}"),
+    ):
+        if filters.get(key) is not None:
+            values.append(filters[key])
+            conditions.append(condition.format(len(values)))
+    return " AND ".join(conditions)
+
+
+def artist_order_by(sort: str):
+    direction = "DESC" if sort.startswith("-") else "ASC"
+    column = ARTIST_SORT_COLUMNS[sort.lstrip("-")]
+    if column == "artist.id":
+        return f"artist.id {direction}"
+    # artist.user_id is unique, so users.id breaks ties as well as artist.id
+    # and keeps the order walkable on the (name, id) users indexes.
+    tiebreak = "users.id" if column.startswith("users.") else "artist.id"
+    return f"{column} {direction}, {tiebreak} {direction}"
+
+
+async def get_artists_count(filters: dict = None):
+    conn = await connect_db()
+    try:
+        values = []
+        conditions = artist_conditions(filters, values)
+        if not filters or (filters.get("gender") is None and filters.get("role") is None):
+            return await conn.fetchval(
+                f"SELECT COUNT(*) FROM artist WHERE {conditions}", *values
+            )
+        return await conn.fetchval(
+            f"""
+            SELECT COUNT(*) FROM artist
             JOIN users ON artist.user_id = users.id
-            ORDER BY artist.id DESC
-            LIMIT $1 OFFSET $2
+            WHERE {conditions}
+            """,
+            *values,
+        )
+    finally:
+        await conn.close()
+
+
+def artist_music_columns(limit: str, offset: str = "0"):
+    # Correlated subqueries in the select list are evaluated only for the
+    # rows that survive ORDER BY/LIMIT, so a page of artists costs one index
+    # range scan per artist. The count comes from the album read model.
+    return f"""
+        (
+            SELECT COALESCE(json_agg(tracks ORDER BY tracks.id DESC), '[]')
+            FROM (
+                SELECT id, artist_id, title, album_name, genre, created_at, updated_at
+                FROM music
+                WHERE music.artist_id = artist.id AND music.deleted_at IS NULL
+                ORDER BY music.id DESC
+                LIMIT {limit} OFFSET {offset}
+            ) AS tracks
+        ) AS music,
+        (
+            SELECT COALESCE(SUM(track_count), 0)
+            FROM album
+            WHERE album.artist_id = artist.id
+        ) AS total_music
+    """
+
+
+def decode_music(row):
+    # asyncpg returns json columns as text.
+    row = dict(row)
+    row["music"] = json.loads(row["music"])
+    return row
+
+
+async def get_artist_with_music(artist_id: int, page: int, page_size: int):
+    conn = await connect_db()
+    try:
+        offset = (page - 1) * page_size
+        query = f"""
+            SELECT {select_list(ARTIST_FIELD_COLUMNS)}, {artist_music_columns("$2", "$3")}
+            FROM artist
+            JOIN users ON users.id = artist.user_id
+            WHERE artist.id = $1 AND artist.deleted_at IS NULL
+        """
+        artist = await conn.fetchrow(query, artist_id, page_size, offset)
+        return decode_music(artist) if artist else None
+    finally:
+        await conn.close()
+
+
+async def get_all_artist(
+    page: int,
+    page_size: int,
+    filters: dict = None,
+    sort: str = "-id",
+    fields: list = None,
+    music_limit: int = None,
+):
+    conn = await connect_db()
+    try:
+        offset = (page - 1) * page_size
+        values = []
+        columns = select_list(ARTIST_FIELD_COLUMNS, fields)
+        order_by = artist_order_by(sort)
+        conditions = artist_conditions(filters, values, "users." in f"{columns} {order_by}")
+        if music_limit:
+            values.append(music_limit)
+            columns += f", {artist_music_columns(f'${len(values)}')}"
+        values.extend([page_size, offset])
+        # Narrow views of artist columns do not need the users row at all.
+        join = ""
+        if "users." in conditions:
+            join = "JOIN users ON artist.user_id = users.id"
+        query = f"""
+            SELECT {columns}
+            FROM artist
+            {join}
+            WHERE {conditions}
+            ORDER BY {order_by}
+            LIMIT ${len(values) - 1} OFFSET ${len(values)}
         """
-        return await conn.fetch(query, page_size, offset)
+        rows = await conn.fetch(query, *values)
+        if music_limit:
+            return [decode_music(row) for row in rows]
+        return rows
     finally:
         await conn.close()
 
@@ -147,6 +338,7 @@ async def get_all_artists_without_pagination():
                 users.updated_at AS user_updated_at
             FROM artist
             JOIN users ON artist.user_id = users.id
+            WHERE artist.deleted_at IS NULL
             ORDER BY artist.id
         """
         return await conn.fetch(query)
@@ -154,17 +346,46 @@ async def get_all_artists_without_pagination():
         await conn.close()
 
 
-async def update_artist(artist_id: int, artist: ArtistUpdate):
-    print(artist)
+async def update_artist(
+    artist_id: int, artist: ArtistUpdate, expected_updated_at: datetime = None
+):
     conn = await connect_db()
     try:
         async with conn.transaction():
-            artist_row = await conn.fetchrow(
-                "SELECT user_id FROM artist WHERE id = $1", artist_id
+            # The row as this update found it, for the audit log.
+            before = await conn.fetchrow(
+                """
+                SELECT
+                    artist.id,
+                    artist.user_id,
+                    artist.first_release_year,
+                    artist.no_of_albums_released,
+                    artist.created_at,
+                    artist.updated_at,
+                    users.first_name,
+                    users.last_name,
+                    users.email,
+                    users.phone,
+                    users.dob,
+                    users.gender,
+                    users.address,
+                    users.role,
+                    users.created_at AS user_created_at,
+                    users.updated_at AS user_updated_at
+                FROM artist
+                JOIN users ON users.id = artist.user_id
+                WHERE artist.id = $1 AND artist.deleted_at IS NULL
+                FOR UPDATE
+                """,
+                artist_id,
             )
-            if not artist_row:
-                return None
-            user_id = artist_row["user_id"]
+            if not before:
+                return None, None
+            if expected_updated_at is not None and expected_updated_at != max(
+                before["updated_at"], before["user_updated_at"]
+            ):
+                raise PreconditionFailed()
+            user_id = before["user_id"]
 
             artist_data = []
             user_data = []
@@ -225,7 +446,11 @@ async def update_artist(artist_id: int, artist: ArtistUpdate):
                 artist_id,
             )
 
-            return dict(result)
+        artist_cache.evict(artist_id)
+        artist_cache.set(artist_id, result)
+        if user_data:
+            user_cache.evict(user_id)
+        return dict(before), dict(result)
 
     finally:
         await conn.close()
@@ -237,24 +462,96 @@ async def delete_artist(artist_id: int):
     try:
         async with conn.transaction():
             user_row = await conn.fetchrow(
-                "SELECT user_id FROM artist WHERE id = $1", artist_id
+                "SELECT user_id FROM artist WHERE id = $1 AND deleted_at IS NULL",
+                artist_id,
             )
             if not user_row:
                 raise Exception("Artist not found")
 
             user_id = user_row["user_id"]
-            await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+            if SOFT_DELETE:
+                # Hide the artist and their user right away; the purger
+                # removes their music in small batches afterwards.
+                await conn.execute(
+                    "UPDATE artist SET deleted_at = CURRENT_TIMESTAMP WHERE id = $1 AND deleted_at IS NULL",
+                    artist_id,
+                )
+                await conn.execute(
+                    "UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = $1 AND deleted_at IS NULL",
+                    user_id,
+                )
+            else:
+                await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+
+        artist_cache.evict(artist_id)
+        artist_by_user_cache.evict(user_id)
+        user_cache.evict(user_id)
+        music_cache.evict_where(lambda music: music["artist_id"] == artist_id)
+        if SOFT_DELETE:
+            purger.kick()
+
+    finally:
+        await conn.close()
+
 
+def like_prefix(text: str):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+async def suggest_artists(q: str, limit: int):
+    q = " ".join(q.lower().split())
+    key = (q, limit)
+    cached = artist_suggest_cache.get(key)
+    if cached is not None:
+        return cached
+    version = artist_suggest_cache.version()
+
+    # "jo" matches either name, "john sm" also matches first and last name
+    # together. Every branch is a prefix match on one of the lower() indexes.
+    values = [like_prefix(q), limit]
+    conditions = [
+        "lower(users.first_name) LIKE $1",
+        "lower(users.last_name) LIKE $1",
+    ]
+    first, _, last = q.partition(" ")
+    if last:
+        values.extend([like_prefix(first), like_prefix(last)])
+        conditions.append(
+            "(lower(users.first_name) LIKE $3 AND lower(users.last_name) LIKE $4)"
+        )
+
+    conn = await connect_db()
+    try:
+        query = f"""
+            SELECT artist.id AS artist_id, users.first_name, users.last_name
+            FROM users
+            JOIN artist ON artist.user_id = users.id
+            WHERE users.deleted_at IS NULL
+              AND artist.deleted_at IS NULL
+              AND ({" OR ".join(conditions)})
+            ORDER BY users.first_name, users.last_name, artist.id
+            LIMIT $2
+        """
+        artists = await conn.fetch(query, *values)
+        artist_suggest_cache.set(key, artists, version)
+        return artists
     finally:
         await conn.close()
 
 
 async def get_artist_by_user_id(user_id: int):
+    cached = artist_by_user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = artist_by_user_cache.version()
     conn = await connect_db()
     try:
         query = """
-            SELECT artist.id FROM artist JOIN users ON artist.user_id = users.id WHERE artist.user_id = $1
+            SELECT artist.id FROM artist JOIN users ON artist.user_id = users.id WHERE artist.user_id = $1 AND artist.deleted_at IS NULL
         """
-        return await conn.fetchrow(query, user_id)
+        artist = await conn.fetchrow(query, user_id)
+        artist_by_user_cache.set(user_id, artist, version)
+        return artist
     finally:
         await conn.close()
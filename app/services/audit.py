@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+from utils.batch_writer import BatchWriter
+from config import AUDIT_BUFFER_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS
+
+AUDIT_COLUMNS = [
+    "actor_id",
+    "actor_role",
+    "entity",
+    "entity_id",
+    "action",
+    "changes",
+    "created_at",
+]
+# Maintained by the database, they change on every write.
+IGNORED_FIELDS = {"updated_at", "user_updated_at", "deleted_at"}
+# The change is recorded, the hash is not.
+REDACTED_FIELDS = {"password"}
+
+audit_log = BatchWriter(
+    "audit_log",
+    AUDIT_COLUMNS,
+    AUDIT_BUFFER_SIZE,
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL_SECONDS,
+)
+
+
+def diff(before, after):
+    before = jsonable_encoder(dict(before)) if before else {}
+    after = jsonable_encoder(dict(after)) if after else {}
+    changes = {}
+    for field in sorted(set(before) | set(after)):
+        if field in IGNORED_FIELDS or before.get(field) == after.get(field):
+            continue
+        if field in REDACTED_FIELDS:
+            changes[field] = {"changed": True}
+        else:
+            changes[field] = {"before": before.get(field), "after": after.get(field)}
+    return changes
+
+
+def record_change(
+    userInfo: dict, entity: str, entity_id: int, action: str, before=None, after=None
+):
+    # Never waits on the database, see BatchWriter.
+    changes = diff(before, after)
+    if action == "update" and not changes:
+        return
+    userInfo = userInfo or {}
+    audit_log.enqueue(
+        (
+            userInfo.get("id"),
+            userInfo.get("role"),
+            entity,
+            entity_id,
+            action,
+            json.dumps(changes),
+            datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+    )
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from db.database import connect_db
+from services.music import VISIBLE_MUSIC
+from services.plays import hour_of, utc_naive
+from utils.cache import charts_cache
+
+CHART_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+# The top plays are picked from the rollup first and only those rows are
+# joined to the catalog, so a deleted track can shorten the list.
+CHART_QUERIES = {
+    "track": f"""
+        SELECT music.id AS music_id, music.title, music.album_name,
+               music.artist_id, top.plays
+        FROM (
+            SELECT music_id, SUM(plays) AS plays
+            FROM play_hourly_track
+            WHERE hour >= $1
+            GROUP BY music_id
+            ORDER BY plays DESC, music_id
+            LIMIT $2
+        ) AS top
+        JOIN music ON music.id = top.music_id
+        WHERE {VISIBLE_MUSIC}
+        ORDER BY top.plays DESC, music.id
+    """,
+    "artist": """
+        SELECT artist.id AS artist_id, users.first_name, users.last_name, top.plays
+        FROM (
+            SELECT artist_id, SUM(plays) AS plays
+            FROM play_hourly_artist
+            WHERE hour >= $1
+            GROUP BY artist_id
+            ORDER BY plays DESC, artist_id
+            LIMIT $2
+        ) AS top
+        JOIN artist ON artist.id = top.artist_id
+        JOIN users ON users.id = artist.user_id
+        WHERE artist.deleted_at IS NULL
+        ORDER BY top.plays DESC, artist.id
+    """,
+    "genre": """
+        SELECT genre, SUM(plays) AS plays
+        FROM play_hourly_genre
+        WHERE hour >= $1
+        GROUP BY genre
+        ORDER BY plays DESC, genre
+        LIMIT $2
+    """,
+}
+
+
+async def get_top_chart(by: str, window: str, limit: int):
+    # Windows are whole hours, the current hour included.
+    since = hour_of(utc_naive() - CHART_WINDOWS[window])
+    key = (by, since, limit)
+    cached = charts_cache.get(key)
+    if cached is not None:
+        return since, cached
+    conn = await connect_db()
+    try:
+        rows = await conn.fetch(CHART_QUERIES[by], since, limit)
+        charts_cache.set(key, rows)
+        return since, rows
+    finally:
+        await conn.close()
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime, timezone
+from db.database import connect_db
+from services.music import VISIBLE_MUSIC
+from utils.cache import StaleWhileRevalidate
+from config import DASHBOARD_CACHE_TTL_SECONDS, DASHBOARD_STALE_SECONDS
+
+
+async def compute_dashboard_summary():
+    conn = await connect_db()
+    try:
+        # One statement, one snapshot: the totals always add up.
+        row = await conn.fetchrow(
+            f"""
+            SELECT
+                (SELECT COUNT(*) FROM artist WHERE deleted_at IS NULL) AS total_artists,
+                (
+                    SELECT COALESCE(json_object_agg(role, total), '{{}}')
+                    FROM (
+                        SELECT role, COUNT(*) AS total
+                        FROM users
+                        WHERE deleted_at IS NULL
+                        GROUP BY role
+                    ) AS roles
+                ) AS users_by_role,
+                (
+                    SELECT COALESCE(json_object_agg(genre, total), '{{}}')
+                    FROM (
+                        SELECT genre, COUNT(*) AS total
+                        FROM music
+                        WHERE {VISIBLE_MUSIC}
+                        GROUP BY genre
+                    ) AS genres
+                ) AS music_by_genre
+            """
+        )
+        users_by_role = json.loads(row["users_by_role"])
+        music_by_genre = json.loads(row["music_by_genre"])
+        return {
+            "total_users": sum(users_by_role.values()),
+            "total_artists": row["total_artists"],
+            "total_music": sum(music_by_genre.values()),
+            "users_by_role": users_by_role,
+            "music_by_genre": music_by_genre,
+            "generated_at": datetime.now(timezone.utc),
+        }
+    finally:
+        await conn.close()
+
+
+dashboard_summary = StaleWhileRevalidate(
+    "dashboard_summary",
+    compute_dashboard_summary,
+    DASHBOARD_CACHE_TTL_SECONDS,
+    DASHBOARD_STALE_SECONDS,
+)
+
+
+async def get_dashboard_summary():
+    return await dashboard_summary.get()
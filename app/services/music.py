@@ -1,9 +1,62 @@
+from datetime import datetime
 from db.database import connect_db
 from services.artist import get_artist_by_user_id
+from services.album import sync_album_counts
 from schemas.music import (
     MusicCreate,
     MusicUpdate,
 )
+from utils.conditional import PreconditionFailed
+from utils.cache import music_cache
+from utils.fields import select_list
+from config import ALBUM_SYNC_ARTIST_COUNT, SOFT_DELETE
+
+# Music stays hidden while the purger is still removing the rows of a
+# soft-deleted artist.
+VISIBLE_MUSIC = """
+    music.deleted_at IS NULL
+    AND EXISTS (
+        SELECT 1 FROM artist
+        WHERE artist.id = music.artist_id AND artist.deleted_at IS NULL
+    )
+"""
+
+MUSIC_FIELD_COLUMNS = {
+    "id": "music.id",
+    "artist_id": "music.artist_id",
+    "title": "music.title",
+    "album_name": "music.album_name",
+    "genre": "music.genre",
+    "created_at": "music.created_at",
+    "updated_at": "music.updated_at",
+}
+MUSIC_FILTER_COLUMNS = {
+    "genre": "music.genre",
+    "album_name": "music.album_name",
+    "artist_id": "music.artist_id",
+}
+MUSIC_SORT_COLUMNS = {
+    "id": "music.id",
+    "title": "music.title",
+}
+
+
+def music_conditions(filters: dict, values: list):
+    # Only whitelisted columns reach the SQL text, values are always bound.
+    conditions = [VISIBLE_MUSIC]
+    for key, column in MUSIC_FILTER_COLUMNS.items():
+        if filters and filters.get(key) is not None:
+            values.append(filters[key])
+            conditions.append(f"{column} = ${len(values)}")
+    return " AND ".join(conditions)
+
+
+def music_order_by(sort: str):
+    direction = "DESC" if sort.startswith("-") else "ASC"
+    column = MUSIC_SORT_COLUMNS[sort.lstrip("-")]
+    if column == "music.id":
+        return f"music.id {direction}"
+    return f"{column} {direction}, music.id {direction}"
 
 
 async def create_music(
@@ -21,15 +74,59 @@ async def create_music(
             music_data.album_name,
             music_data.genre,
         )
+        if music and ALBUM_SYNC_ARTIST_COUNT:
+            await sync_album_counts(conn, [music["artist_id"]])
         return music if music else None
     finally:
         await conn.close()
 
 
 async def get_music_by_id(id: int):
+    cached = music_cache.get(id)
+    if cached is not None:
+        return cached
+    version = music_cache.version()
+    conn = await connect_db()
+    try:
+        music = await conn.fetchrow(
+            f"SELECT * FROM music WHERE id = $1 AND {VISIBLE_MUSIC}", id
+        )
+        music_cache.set(id, music, version)
+        return music
+    finally:
+        await conn.close()
+
+
+async def get_music_by_ids(ids: list):
+    music = {}
+    for id in ids:
+        cached = music_cache.get(id)
+        if cached is not None:
+            music[id] = cached
+    missing = [id for id in ids if id not in music]
+    if not missing:
+        return music
+    version = music_cache.version()
+    conn = await connect_db()
+    try:
+        rows = await conn.fetch(
+            f"SELECT * FROM music WHERE id = ANY($1::int[]) AND {VISIBLE_MUSIC}",
+            missing,
+        )
+        for row in rows:
+            music_cache.set(row["id"], row, version)
+            music[row["id"]] = row
+        return music
+    finally:
+        await conn.close()
+
+
+async def get_music_updated_at(id: int):
     conn = await connect_db()
     try:
-        return await conn.fetchrow("SELECT * FROM music WHERE id = $1", id)
+        return await conn.fetchval(
+            f"SELECT updated_at FROM music WHERE id = $1 AND {VISIBLE_MUSIC}", id
+        )
     finally:
         await conn.close()
 
@@ -37,9 +134,9 @@ async def get_music_by_id(id: int):
 async def get_music_by_artist_id(artist_id: int, page: int, page_size: int):
     conn = await connect_db()
     try:
-        offset = (page - 1) * 10
+        offset = (page - 1) * page_size
         return await conn.fetch(
-            "SELECT * FROM music WHERE artist_id = $1 ORDER BY id DESC LIMIT $2 OFFSET $3",
+            f"SELECT * FROM music WHERE artist_id = $1 AND {VISIBLE_MUSIC} ORDER BY id DESC LIMIT $2 OFFSET $3",
             artist_id,
             page_size,
             offset,
@@ -60,10 +157,14 @@ async def get_music_by_user_id(user_id: int, page: int, page_size: int):
         await conn.close()
 
 
-async def get_music_count():
+async def get_music_count(filters: dict = None):
     conn = await connect_db()
     try:
-        return await conn.fetchval("SELECT COUNT(*) FROM music")
+        values = []
+        conditions = music_conditions(filters, values)
+        return await conn.fetchval(
+            f"SELECT COUNT(*) FROM music WHERE {conditions}", *values
+        )
     finally:
         await conn.close()
 
@@ -72,63 +173,112 @@ async def get_music_by_artist_count(artist_id: int):
     conn = await connect_db()
     try:
         return await conn.fetchval(
-            "SELECT COUNT(*) FROM music WHERE artist_id = $1", artist_id
+            f"SELECT COUNT(*) FROM music WHERE artist_id = $1 AND {VISIBLE_MUSIC}",
+            artist_id,
         )
     finally:
         await conn.close()
 
 
-async def get_all_music(page: int, page_size: int):
+async def get_all_music(
+    page: int,
+    page_size: int,
+    filters: dict = None,
+    sort: str = "-id",
+    fields: list = None,
+):
     conn = await connect_db()
     try:
-        offset = (page - 1) * 10
-        query = """
-          SELECT * FROM music ORDER BY id DESC LIMIT $1 OFFSET $2
+        offset = (page - 1) * page_size
+        values = []
+        conditions = music_conditions(filters, values)
+        values.extend([page_size, offset])
+        query = f"""
+          SELECT {select_list(MUSIC_FIELD_COLUMNS, fields)} FROM music
+          WHERE {conditions}
+          ORDER BY {music_order_by(sort)}
+          LIMIT ${len(values) - 1} OFFSET ${len(values)}
       """
-        return await conn.fetch(query, page_size, offset)
+        return await conn.fetch(query, *values)
     finally:
         await conn.close()
 
 
-async def update_music(music_id: int, music: MusicUpdate):
+async def update_music(
+    music_id: int, music: MusicUpdate, expected_updated_at: datetime = None
+):
     conn = await connect_db()
 
     try:
+        async with conn.transaction():
+            # The row as this update found it, for the audit log.
+            before = await conn.fetchrow(
+                f"SELECT * FROM music WHERE id = $1 AND {VISIBLE_MUSIC} FOR UPDATE",
+                music_id,
+            )
+            if not before:
+                if expected_updated_at is not None:
+                    raise PreconditionFailed()
+                return None, None
+            if (
+                expected_updated_at is not None
+                and before["updated_at"] != expected_updated_at
+            ):
+                raise PreconditionFailed()
 
-        update_fields = []
-        values = []
-        index = 1
+            update_fields = []
+            values = []
+            index = 1
 
-        for key, value in music.model_dump(exclude_unset=True).items():
-            update_fields.append(f"{key} = ${index}")
-            values.append(value)
-            index += 1
+            for key, value in music.model_dump(exclude_unset=True).items():
+                update_fields.append(f"{key} = ${index}")
+                values.append(value)
+                index += 1
 
-        values.append(music_id)
-
-        query = f"""
-            UPDATE music
-            SET {', '.join(update_fields)}
-            WHERE id = ${index}
-            RETURNING id, artist_id, title, album_name, genre, created_at, updated_at
-        """
+            values.append(music_id)
+            query = f"""
+                UPDATE music
+                SET {', '.join(update_fields)}
+                WHERE id = ${index}
+                RETURNING *
+            """
 
-        updated_music = await conn.fetchrow(query, *values)
-        return dict(updated_music) if updated_music else None
+            # Same shape as the SELECT * rows the readers cache.
+            updated_music = await conn.fetchrow(query, *values)
+            if ALBUM_SYNC_ARTIST_COUNT:
+                await sync_album_counts(
+                    conn, [before["artist_id"], updated_music["artist_id"]]
+                )
+        music_cache.evict(music_id)
+        music_cache.set(music_id, updated_music)
+        return dict(before), dict(updated_music)
 
     finally:
         await conn.close()
 
 
-async def delete_music(music_id: int):
+async def delete_music(music_id: int, artist_id: int = None):
     conn = await connect_db()
 
     try:
-
-        query = f"""
-           DELETE FROM music WHERE id = $1
-        """
-        await conn.execute(query, music_id)
+        if SOFT_DELETE:
+            # Deleting again must not move the timestamp or re-sync albums.
+            query = "UPDATE music SET deleted_at = CURRENT_TIMESTAMP WHERE id = $1 AND deleted_at IS NULL"
+        else:
+            query = "DELETE FROM music WHERE id = $1"
+        if artist_id is not None:
+            # Passing the partition key lets a partitioned music table prune
+            # to a single partition.
+            deleted_artist_id = await conn.fetchval(
+                f"{query} AND artist_id = $2 RETURNING artist_id", music_id, artist_id
+            )
+        else:
+            deleted_artist_id = await conn.fetchval(
+                f"{query} RETURNING artist_id", music_id
+            )
+        if deleted_artist_id and ALBUM_SYNC_ARTIST_COUNT:
+            await sync_album_counts(conn, [deleted_artist_id])
+        music_cache.evict(music_id)
         return
     finally:
         await conn.close()
@@ -144,6 +294,7 @@ async def get_music_page_data():
                 users.last_name
             FROM artist
             JOIN users ON users.id = artist.user_id
+            WHERE artist.deleted_at IS NULL
         """
         return await conn.fetch(query)
     finally:
@@ -0,0 +1,118 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from utils.batch_writer import BatchWriter
+from config import (
+    PLAYS_BUFFER_SIZE,
+    PLAYS_BATCH_SIZE,
+    PLAYS_FLUSH_INTERVAL_SECONDS,
+    PLAYS_MAX_BACKFILL_SECONDS,
+    PLAYS_MAX_CLOCK_SKEW_SECONDS,
+)
+
+PLAY_COLUMNS = ["music_id", "artist_id", "genre", "user_id", "played_at"]
+
+
+def utc_naive(value: datetime = None):
+    # Timestamps are stored as naive UTC, like timezone('utc', now()).
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def play_time(played_at: datetime, now: datetime):
+    # None when the timestamp is outside the accepted window.
+    if played_at is None:
+        return now
+    played_at = utc_naive(played_at)
+    if played_at < now - timedelta(seconds=PLAYS_MAX_BACKFILL_SECONDS):
+        return None
+    if played_at > now + timedelta(seconds=PLAYS_MAX_CLOCK_SKEW_SECONDS):
+        return None
+    return played_at
+
+
+def hour_of(played_at: datetime):
+    return played_at.replace(minute=0, second=0, microsecond=0)
+
+
+async def update_rollups(conn, batch: list):
+    # One upsert per rollup for the whole batch. Keys are sorted so
+    # concurrent flushes from several workers lock rows in the same order.
+    tracks = Counter()
+    artists = Counter()
+    genres = Counter()
+    for music_id, artist_id, genre, _, played_at in batch:
+        hour = hour_of(played_at)
+        tracks[(hour, music_id, artist_id)] += 1
+        artists[(hour, artist_id)] += 1
+        genres[(hour, genre)] += 1
+
+    track_keys = sorted(tracks)
+    await conn.execute(
+        """
+        INSERT INTO play_hourly_track (hour, music_id, artist_id, plays)
+        SELECT * FROM unnest($1::timestamp[], $2::int[], $3::int[], $4::bigint[])
+        ON CONFLICT (hour, music_id)
+        DO UPDATE SET plays = play_hourly_track.plays + EXCLUDED.plays
+        """,
+        [key[0] for key in track_keys],
+        [key[1] for key in track_keys],
+        [key[2] for key in track_keys],
+        [tracks[key] for key in track_keys],
+    )
+    artist_keys = sorted(artists)
+    await conn.execute(
+        """
+        INSERT INTO play_hourly_artist (hour, artist_id, plays)
+        SELECT * FROM unnest($1::timestamp[], $2::int[], $3::bigint[])
+        ON CONFLICT (hour, artist_id)
+        DO UPDATE SET plays = play_hourly_artist.plays + EXCLUDED.plays
+        """,
+        [key[0] for key in artist_keys],
+        [key[1] for key in artist_keys],
+        [artists[key] for key in artist_keys],
+    )
+    genre_keys = sorted(genres)
+    await conn.execute(
+        """
+        INSERT INTO play_hourly_genre (hour, genre, plays)
+        SELECT * FROM unnest($1::timestamp[], $2::genre_type[], $3::bigint[])
+        ON CONFLICT (hour, genre)
+        DO UPDATE SET plays = play_hourly_genre.plays + EXCLUDED.plays
+        """,
+        [key[0] for key in genre_keys],
+        [key[1] for key in genre_keys],
+        [genres[key] for key in genre_keys],
+    )
+
+
+play_log = BatchWriter(
+    "plays",
+    PLAY_COLUMNS,
+    PLAYS_BUFFER_SIZE,
+    PLAYS_BATCH_SIZE,
+    PLAYS_FLUSH_INTERVAL_SECONDS,
+    after_copy=update_rollups,
+)
+
+
+def record_plays(user_id: int, events: list, tracks: dict):
+    # events are (music_id, played_at) pairs already resolved against
+    # tracks and bounded by play_time(), so the hot path never queries the
+    # catalog.
+    accepted = 0
+    for music_id, played_at in events:
+        track = tracks[music_id]
+        if play_log.enqueue(
+            (
+                music_id,
+                track["artist_id"],
+                track["genre"],
+                user_id,
+                played_at,
+            )
+        ):
+            accepted += 1
+    return accepted
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from db.database import connect_db
+from config import PURGE_BATCH_SIZE, PURGE_BATCH_PAUSE_SECONDS, PURGE_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_batch(conn, batch_size: int):
+    # Every statement runs in its own short transaction so no lock is held
+    # for longer than one batch. SKIP LOCKED lets several workers purge
+    # side by side.
+    artist = await conn.fetchrow(
+        """
+        SELECT id, user_id FROM artist
+        WHERE deleted_at IS NOT NULL
+        ORDER BY deleted_at
+        LIMIT 1
+        """
+    )
+    if artist:
+        status = await conn.execute(
+            """
+            DELETE FROM music
+            WHERE artist_id = $1 AND id IN (
+                SELECT id FROM music WHERE artist_id = $1
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            """,
+            artist["id"],
+            batch_size,
+        )
+        if int(status.split()[-1]):
+            return True
+        # No music left, the cascade from users only removes the artist row.
+        await conn.execute("DELETE FROM users WHERE id = $1", artist["user_id"])
+        return True
+
+    status = await conn.execute(
+        """
+        DELETE FROM music WHERE id IN (
+            SELECT id FROM music WHERE deleted_at IS NOT NULL
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        """,
+        batch_size,
+    )
+    if int(status.split()[-1]):
+        return True
+
+    status = await conn.execute(
+        """
+        DELETE FROM users WHERE id IN (
+            SELECT id FROM users
+            WHERE deleted_at IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM artist WHERE artist.user_id = users.id)
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        """,
+        batch_size,
+    )
+    return bool(int(status.split()[-1]))
+
+
+class Purger:
+    def __init__(self, batch_size: int, pause: float, interval: float):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def kick(self):
+        self.wakeup.set()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def purge(self):
+        conn = await connect_db()
+        try:
+            # Purged rows were announced on entity_changes when they were
+            # soft deleted, notify_entity_change skips them in this session.
+            await conn.execute("SET app.purging = 'on'")
+            while await purge_batch(conn, self.batch_size):
+                await asyncio.sleep(self.pause)
+            await conn.execute(
+                "DELETE FROM revoked_tokens WHERE expires_at < timezone('utc', now())"
+            )
+        finally:
+            await conn.close()
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                await self.purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Purging soft-deleted rows failed")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+purger = Purger(PURGE_BATCH_SIZE, PURGE_BATCH_PAUSE_SECONDS, PURGE_INTERVAL_SECONDS)
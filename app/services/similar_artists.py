@@ -0,0 +1,227 @@
+import asyncio
+import logging
+from typing import get_args
+import numpy as np
+from db.database import connect_db
+from schemas.music import Genre
+from config import SIMILAR_ARTISTS_REFRESH_SECONDS, SIMILAR_ERA_SCALE_YEARS
+
+logger = logging.getLogger(__name__)
+
+GENRES = list(get_args(Genre))
+GENRE_INDEX = {genre: index for index, genre in enumerate(GENRES)}
+
+
+def normalize(counts):
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    return np.divide(counts, norms, out=np.zeros_like(counts), where=norms > 0)
+
+
+class ArtistGenreIndex:
+    # Artist by genre track counts held in memory. Rows are L2 normalized
+    # once, so ranking every artist is a single matrix-vector product.
+    # Music and artist changes mark artists dirty; their rows are re-queried
+    # in one batch after a short debounce. Listener gaps rebuild everything.
+
+    def __init__(self, refresh_delay: float, era_scale: float):
+        self.refresh_delay = refresh_delay
+        self.era_scale = era_scale
+        self.artist_ids = np.zeros(0, dtype=np.int64)
+        self.positions = {}
+        self.counts = np.zeros((0, len(GENRES)))
+        self.vectors = np.zeros((0, len(GENRES)))
+        self.years = np.zeros(0)
+        self.active = np.zeros(0, dtype=bool)
+        self.loaded = False
+        self.loading = None
+        self.dirty = set()
+        self.refreshing = None
+        self.full_reloads = 0
+        self.partial_refreshes = 0
+
+    async def fetch(self, conn, artist_ids: list = None):
+        if artist_ids is None:
+            artists = await conn.fetch(
+                "SELECT id, first_release_year FROM artist WHERE deleted_at IS NULL"
+            )
+            counts = await conn.fetch(
+                """
+                SELECT music.artist_id, music.genre, COUNT(*) AS total
+                FROM music
+                JOIN artist ON artist.id = music.artist_id
+                WHERE music.deleted_at IS NULL AND artist.deleted_at IS NULL
+                GROUP BY music.artist_id, music.genre
+                """
+            )
+        else:
+            artists = await conn.fetch(
+                """
+                SELECT id, first_release_year FROM artist
+                WHERE id = ANY($1::int[]) AND deleted_at IS NULL
+                """,
+                artist_ids,
+            )
+            counts = await conn.fetch(
+                """
+                SELECT artist_id, genre, COUNT(*) AS total
+                FROM music
+                WHERE artist_id = ANY($1::int[]) AND deleted_at IS NULL
+                GROUP BY artist_id, genre
+                """,
+                artist_ids,
+            )
+        rows = {
+            row["id"]: [row["first_release_year"], np.zeros(len(GENRES))]
+            for row in artists
+        }
+        for row in counts:
+            if row["artist_id"] in rows:
+                rows[row["artist_id"]][1][GENRE_INDEX[row["genre"]]] = row["total"]
+        return rows
+
+    async def load(self):
+        # Changes seen while the snapshot loads are applied right after it.
+        self.dirty.clear()
+        conn = await connect_db()
+        try:
+            rows = await self.fetch(conn)
+        finally:
+            await conn.close()
+        ids = sorted(rows)
+        self.artist_ids = np.array(ids, dtype=np.int64)
+        self.positions = {artist_id: index for index, artist_id in enumerate(ids)}
+        self.counts = np.array([rows[id][1] for id in ids]).reshape(-1, len(GENRES))
+        self.vectors = normalize(self.counts)
+        self.years = np.array([rows[id][0] for id in ids], dtype=float)
+        self.active = self.counts.sum(axis=1) > 0
+        self.loaded = True
+        self.full_reloads += 1
+        if self.dirty:
+            self.schedule_refresh()
+
+    async def ensure_loaded(self):
+        if self.loaded:
+            return
+        if self.loading is None or self.loading.done():
+            self.loading = asyncio.create_task(self.load())
+        await asyncio.shield(self.loading)
+
+    async def refresh(self):
+        # Loops until nothing is dirty: schedule_refresh() is a no-op while
+        # this task runs, so artists marked during the fetch are picked up
+        # by the next round. Without a load, the full load picks them up.
+        while True:
+            await asyncio.sleep(self.refresh_delay)
+            if not self.loaded or not self.dirty:
+                return
+            artist_ids = sorted(self.dirty)
+            self.dirty.clear()
+            try:
+                conn = await connect_db()
+                try:
+                    rows = await self.fetch(conn, artist_ids)
+                finally:
+                    await conn.close()
+            except Exception:
+                self.dirty.update(artist_ids)
+                raise
+            self.apply(artist_ids, rows)
+            self.partial_refreshes += 1
+
+    def apply(self, artist_ids: list, rows: dict):
+        new_ids = [id for id in artist_ids if id in rows and id not in self.positions]
+        if new_ids:
+            start = len(self.artist_ids)
+            self.positions.update(
+                {artist_id: start + index for index, artist_id in enumerate(new_ids)}
+            )
+            self.artist_ids = np.concatenate([self.artist_ids, new_ids])
+            self.counts = np.vstack([self.counts, np.zeros((len(new_ids), len(GENRES)))])
+            self.vectors = np.vstack([self.vectors, np.zeros((len(new_ids), len(GENRES)))])
+            self.years = np.concatenate([self.years, np.zeros(len(new_ids))])
+            self.active = np.concatenate([self.active, np.zeros(len(new_ids), dtype=bool)])
+        for artist_id in artist_ids:
+            position = self.positions.get(artist_id)
+            if position is None:
+                continue
+            # Deleted artists keep their slot until the next full reload.
+            year, counts = rows.get(artist_id, (0, np.zeros(len(GENRES))))
+            self.counts[position] = counts
+            self.vectors[position] = normalize(counts[np.newaxis])[0]
+            self.years[position] = year
+            self.active[position] = counts.sum() > 0
+
+    def schedule_refresh(self):
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.refresh())
+            self.refreshing.add_done_callback(self.log_failure)
+
+    def handle_event(self, event: dict):
+        table = event.get("table")
+        if table == "music":
+            # A track moved to another artist changes both vectors.
+            artist_ids = {event.get("artist_id"), event.get("old_artist_id")}
+        elif table == "artist":
+            artist_ids = {event.get("id")}
+        else:
+            return
+        artist_ids.discard(None)
+        if not artist_ids:
+            return
+        self.dirty.update(artist_ids)
+        if self.loaded:
+            self.schedule_refresh()
+
+    def schedule_reload(self):
+        # Listener gap handlers are synchronous. The next request reloads.
+        self.loaded = False
+
+    def log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Refreshing similar artists failed", exc_info=task.exception())
+
+    def similar(self, artist_id: int, limit: int, era_weight: float = 0.0):
+        position = self.positions.get(artist_id)
+        if position is None or not self.active[position]:
+            return None
+        scores = self.vectors @ self.vectors[position]
+        if era_weight:
+            era = np.exp(-np.abs(self.years - self.years[position]) / self.era_scale)
+            scores = (1 - era_weight) * scores + era_weight * era
+        scores = np.where(self.active, scores, -np.inf)
+        scores[position] = -np.inf
+        limit = min(limit, int(self.active.sum()) - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {
+                "artist_id": int(self.artist_ids[index]),
+                "score": round(float(scores[index]), 6),
+                "genres": {
+                    genre: int(self.counts[index][column])
+                    for column, genre in enumerate(GENRES)
+                    if self.counts[index][column]
+                },
+            }
+            for index in top
+        ]
+
+    def stats(self):
+        return {
+            "artists": int(self.active.sum()),
+            "slots": len(self.artist_ids),
+            "loaded": self.loaded,
+            "dirty": len(self.dirty),
+            "full_reloads": self.full_reloads,
+            "partial_refreshes": self.partial_refreshes,
+        }
+
+
+similar_artists = ArtistGenreIndex(SIMILAR_ARTISTS_REFRESH_SECONDS, SIMILAR_ERA_SCALE_YEARS)
+
+
+async def get_similar_artists(artist_id: int, limit: int, era_weight: float = 0.0):
+    await similar_artists.ensure_loaded()
+    return similar_artists.similar(artist_id, limit, era_weight)
@@ -0,0 +1,28 @@
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_query_plans  # noqa: E402
+
+pytestmark = pytest.mark.skipif(
+    not check_query_plans.DATABASE_URL,
+    reason="needs a seeded database, see check_query_plans.py",
+)
+
+
+def test_query_plans_match_snapshots():
+    plans, errors = asyncio.run(check_query_plans.record_plans())
+    assert not errors, errors
+
+    snapshots = check_query_plans.load_snapshots()
+    failures = {
+        label: problems
+        for label, problems in check_query_plans.find_problems(plans, snapshots).items()
+        if problems
+    }
+    assert not failures, "\n".join(
+        f"{label}: {'; '.join(problems)}" for label, problems in failures.items()
+    )
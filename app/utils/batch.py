@@ -0,0 +1,42 @@
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from config import BATCH_FETCH_MAX_IDS
+
+# Ids are INTEGER columns, larger values would fail as query parameters.
+MAX_ID = 2147483647
+
+
+def parse_ids(ids: Optional[str]):
+    # ?ids=3,1,2 -> [3, 1, 2], duplicates dropped, request order kept.
+    if ids is None:
+        return None
+    try:
+        parsed = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="ids must be a comma separated list of integers"
+        )
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed or any(value < 1 for value in parsed):
+        raise HTTPException(status_code=400, detail="ids must be positive integers")
+    if any(value > MAX_ID for value in parsed):
+        raise HTTPException(status_code=400, detail=f"ids must be at most {MAX_ID}")
+    if len(parsed) > BATCH_FETCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_FETCH_MAX_IDS} ids can be fetched at once",
+        )
+    return parsed
+
+
+def batch_response(key: str, ids: list, rows: dict, fields: list):
+    items = [
+        {field: rows[id][field] for field in fields} for id in ids if id in rows
+    ]
+    return JSONResponse(
+        jsonable_encoder(
+            {key: items, "missing": [id for id in ids if id not in rows]}
+        )
+    )
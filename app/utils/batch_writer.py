@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from db.database import connect_db
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    # Write-behind buffer for append-only tables. Callers enqueue records
+    # without waiting on the database; a background task COPYs them in
+    # batches. The buffer is bounded: when it is full new records are
+    # dropped and counted rather than slowing requests down. A batch that
+    # fails to write goes back to the front of the buffer and is retried with
+    # exponential backoff. after_copy, when given, runs in the same
+    # transaction as the COPY so derived tables never disagree with the raw
+    # rows.
+
+    def __init__(
+        self,
+        table: str,
+        columns: list,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        after_copy=None,
+        max_backoff: float = 60.0,
+    ):
+        self.table = table
+        self.columns = columns
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.after_copy = after_copy
+        self.max_backoff = max_backoff
+        self.buffer = deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.consecutive_failures = 0
+        self.batches = 0
+        self.high_watermark = 0
+        self.last_flush_ms = None
+
+    def drop(self, count: int):
+        previous = self.dropped
+        self.dropped += count
+        if previous == 0 or previous // 1000 != self.dropped // 1000:
+            logger.warning(
+                "%s buffer is full, %d records dropped so far",
+                self.table,
+                self.dropped,
+            )
+
+    def requeue(self, batch: list):
+        # Records enqueued while the batch was out keep their place; what no
+        # longer fits is dropped from the newest end of the batch.
+        room = max(self.max_size - len(self.buffer), 0)
+        self.buffer.extendleft(reversed(batch[:room]))
+        if len(batch) > room:
+            self.drop(len(batch) - room)
+
+    def backoff(self):
+        return min(
+            self.flush_interval * 2 ** (self.consecutive_failures - 1),
+            self.max_backoff,
+        )
+
+    def enqueue(self, record: tuple):
+        if len(self.buffer) >= self.max_size:
+            self.drop(1)
+            return False
+        self.buffer.append(record)
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, len(self.buffer))
+        if len(self.buffer) >= self.batch_size:
+            self.wakeup.set()
+        return True
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # Whatever is still buffered goes out before shutdown.
+        while self.buffer:
+            if not await self.flush():
+                logger.error(
+                    "%d %s records were not written before shutdown",
+                    len(self.buffer),
+                    self.table,
+                )
+                break
+
+    async def flush(self):
+        batch = [
+            self.buffer.popleft()
+            for _ in range(min(self.batch_size, len(self.buffer)))
+        ]
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            conn = await connect_db()
+            try:
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        self.table, records=batch, columns=self.columns
+                    )
+                    if self.after_copy is not None:
+                        await self.after_copy(conn, batch)
+            finally:
+                await conn.close()
+        except asyncio.CancelledError:
+            self.requeue(batch)
+            raise
+        except Exception:
+            self.requeue(batch)
+            self.failed_flushes += 1
+            self.consecutive_failures += 1
+            logger.exception("Writing %d records to %s failed", len(batch), self.table)
+            return False
+        self.consecutive_failures = 0
+        self.written += len(batch)
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            while self.buffer:
+                if not await self.flush():
+                    await asyncio.sleep(self.backoff())
+
+    def stats(self):
+        return {
+            "table": self.table,
+            "queued": len(self.buffer),
+            "max_size": self.max_size,
+            "high_watermark": self.high_watermark,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "batches": self.batches,
+            "last_flush_ms": self.last_flush_ms,
+        }
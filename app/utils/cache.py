@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from config import (
+    ARTIST_CACHE_SIZE,
+    MUSIC_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    ENTITY_CACHE_TTL_SECONDS,
+    ARTIST_SUGGEST_CACHE_SIZE,
+    ARTIST_SUGGEST_CACHE_TTL_SECONDS,
+    CHARTS_CACHE_SIZE,
+    CHARTS_CACHE_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    # Invalidations are stamped from one counter. evict() stamps its key, so
+    # it only rejects loads of that key; evict_where() and clear() cannot
+    # know which keys are being loaded and raise the floor for all of them.
+    # Only the newest stamps are kept: forgetting an older one raises the
+    # floor to it, which rejects more loads, never fewer.
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.clock = 0
+        self.floor = 0
+        self.invalidated = OrderedDict()
+        self.max_invalidated = max(max_size, 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def version(self):
+        # Readers take the version before querying and pass it to set(), so a
+        # row loaded before a concurrent invalidation is never cached.
+        return self.clock
+
+    def invalidate(self, key):
+        self.clock += 1
+        self.invalidated[key] = self.clock
+        self.invalidated.move_to_end(key)
+        while len(self.invalidated) > self.max_invalidated:
+            _, stamp = self.invalidated.popitem(last=False)
+            self.floor = max(self.floor, stamp)
+
+    def invalidate_all(self):
+        self.clock += 1
+        self.floor = self.clock
+        self.invalidated.clear()
+
+    def is_current(self, key, version: int):
+        return version >= self.floor and version >= self.invalidated.get(key, 0)
+
+    def set(self, key, value, version: int = None):
+        if self.max_size <= 0 or value is None:
+            return
+        if version is not None and not self.is_current(key, version):
+            return
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def evict(self, key):
+        self.invalidate(key)
+        if self.entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def evict_where(self, predicate):
+        self.invalidate_all()
+        for key in [key for key, (value, _) in self.entries.items() if predicate(value)]:
+            del self.entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidate_all()
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class StaleWhileRevalidate:
+    # Caches a single computed value. Within ttl it is served as is; for
+    # stale_ttl after that it is still served while one background task
+    # recomputes it. Callers that find no usable value all await the same
+    # in-flight computation.
+
+    def __init__(self, name: str, loader, ttl: float, stale_ttl: float):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.value = None
+        self.loaded_at = None
+        self.refreshing = None
+
+    def refresh(self):
+        if self.refreshing is None:
+            # A fresh context keeps the request's profiler and deadline out
+            # of the shared computation.
+            self.refreshing = contextvars.Context().run(
+                asyncio.create_task, self.load()
+            )
+            self.refreshing.add_done_callback(self.log_failure)
+        return self.refreshing
+
+    async def load(self):
+        try:
+            value = await self.loader()
+            self.value = value
+            self.loaded_at = time.monotonic()
+            return value
+        finally:
+            self.refreshing = None
+
+    def log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Refreshing %s failed", self.name, exc_info=task.exception()
+            )
+
+    async def get(self):
+        if self.loaded_at is not None:
+            age = time.monotonic() - self.loaded_at
+            if age < self.ttl:
+                return self.value
+            if age < self.ttl + self.stale_ttl:
+                self.refresh()
+                return self.value
+        # shield: a caller that goes away must not cancel the computation
+        # other callers are waiting for.
+        return await asyncio.shield(self.refresh())
+
+    def clear(self):
+        self.value = None
+        self.loaded_at = None
+
+
+artist_cache = TTLCache("artist", ARTIST_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS)
+artist_by_user_cache = TTLCache(
+    "artist_by_user", ARTIST_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS
+)
+music_cache = TTLCache("music", MUSIC_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS)
+user_cache = TTLCache("users", USER_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS)
+artist_suggest_cache = TTLCache(
+    "artist_suggest", ARTIST_SUGGEST_CACHE_SIZE, ARTIST_SUGGEST_CACHE_TTL_SECONDS
+)
+# Rollups change with every flushed batch, charts only expire.
+charts_cache = TTLCache("charts", CHARTS_CACHE_SIZE, CHARTS_CACHE_TTL_SECONDS)
+
+entity_caches = [
+    artist_cache,
+    artist_by_user_cache,
+    music_cache,
+    user_cache,
+    artist_suggest_cache,
+]
+
+
+def cache_stats():
+    return [cache.stats() for cache in [*entity_caches, charts_cache]]
+
+
+def handle_entity_change(event: dict):
+    table = event.get("table")
+    entity_id = event.get("id")
+    if table in ("users", "artist"):
+        # Any name or roster change can reorder the suggestions.
+        artist_suggest_cache.clear()
+    if table == "users":
+        user_cache.evict(entity_id)
+        artist_by_user_cache.evict(entity_id)
+        artist_cache.evict_where(lambda artist: artist["user_id"] == entity_id)
+    elif table == "artist":
+        artist_cache.evict(entity_id)
+        artist_by_user_cache.evict(event.get("user_id"))
+        if event.get("op") == "DELETE":
+            music_cache.evict_where(lambda music: music["artist_id"] == entity_id)
+    elif table == "music":
+        music_cache.evict(entity_id)
+
+
+def flush_entity_caches():
+    for cache in entity_caches:
+        cache.clear()
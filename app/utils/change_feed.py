@@ -0,0 +1,48 @@
+import asyncio
+from config import CHANGE_FEED_BUFFER_SIZE
+
+FEED_TABLES = {"music", "artist"}
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def push(self, event: dict):
+        # A slow consumer loses its oldest events instead of growing memory;
+        # the stream tells the client how many it missed so it can resync.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class ChangeFeed:
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+
+    def subscribe(self):
+        subscription = Subscription(self.buffer_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, event: dict):
+        if event.get("table") not in FEED_TABLES:
+            return
+        for subscription in self.subscribers:
+            subscription.push(event)
+
+    def resync(self):
+        for subscription in self.subscribers:
+            subscription.push({"op": "RESYNC"})
+
+
+change_feed = ChangeFeed(CHANGE_FEED_BUFFER_SIZE)
@@ -0,0 +1,75 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import HTTPException, Request
+
+
+class PreconditionFailed(Exception):
+    pass
+
+
+def make_etag(entity: str, entity_id: int, updated_at: datetime):
+    digest = hashlib.sha1(
+        f"{entity}:{entity_id}:{updated_at.isoformat()}".encode()
+    ).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def to_utc(value: datetime):
+    # updated_at columns are TIMESTAMP without time zone, written as UTC.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def cache_headers(entity: str, entity_id: int, updated_at: datetime):
+    return {
+        "ETag": make_etag(entity, entity_id, updated_at),
+        "Last-Modified": format_datetime(to_utc(updated_at), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def has_conditional_headers(request: Request):
+    return (
+        "if-none-match" in request.headers or "if-modified-since" in request.headers
+    )
+
+
+def etag_in(header_value: str, etag: str, weak: bool):
+    # RFC 9110: If-None-Match compares weakly, If-Match strongly, so a W/
+    # validator never satisfies If-Match.
+    candidates = [value.strip() for value in header_value.split(",")]
+    if "*" in candidates:
+        return True
+    if weak:
+        return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+    return not etag.startswith("W/") and etag in candidates
+
+
+def is_not_modified(request: Request, headers: dict):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+        return etag_in(if_none_match, headers["ETag"], weak=True)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        last_modified = parsedate_to_datetime(headers["Last-Modified"])
+        return last_modified <= since
+
+    return False
+
+
+def check_if_match(request: Request, etag: str):
+    if_match = request.headers.get("if-match")
+    if if_match is not None and not etag_in(if_match, etag, weak=False):
+        raise HTTPException(
+            status_code=412, detail="Resource has been modified by another request"
+        )
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from asyncpg.exceptions import QueryCanceledError
+from fastapi import HTTPException, Request
+from config import DISCONNECT_POLL_SECONDS
+
+current_deadline = ContextVar("current_deadline", default=None)
+
+
+def statement_timeout_ms():
+    # Read by connect_db so the server stops the query even when the event
+    # loop is too busy to cancel it.
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    # statement_timeout = 0 would mean no limit at all.
+    return max(int((deadline - time.monotonic()) * 1000), 1)
+
+
+async def run_until_deadline(request: Request, seconds: float, call):
+    # Runs call() in its own task and cancels it when the client disconnects
+    # or the deadline passes. Cancelling a task that waits on asyncpg sends a
+    # cancel request for the running query, and the service's finally block
+    # closes the connection before this returns.
+    deadline = time.monotonic() + seconds
+    token = current_deadline.set(deadline)
+    try:
+        task = asyncio.ensure_future(call())
+    finally:
+        current_deadline.reset(token)
+
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise HTTPException(status_code=504, detail="Request deadline exceeded")
+            done, _ = await asyncio.wait(
+                {task}, timeout=min(DISCONNECT_POLL_SECONDS, remaining)
+            )
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client closed request")
+    except (QueryCanceledError, asyncio.TimeoutError):
+        # asyncio.TimeoutError: a shared flight outlived this caller's deadline.
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import HTTPException
+
+
+def parse_fields(fields: Optional[str], allowed: dict):
+    # ?fields=first_name,first_release_year -> ["id", "first_name", ...].
+    # None means the full row; the id is always returned so clients can key
+    # the rows.
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. "
+            f"Allowed fields: {', '.join(allowed)}",
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+
+def select_list(columns: dict, fields: list = None):
+    # Only whitelisted column expressions reach the SQL text.
+    return ", ".join(f"{columns[field]} AS {field}" for field in (fields or columns))
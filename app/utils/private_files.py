@@ -0,0 +1,30 @@
+import os
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+
+
+def list_files(directory: str, suffix: str):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (
+            {
+                "name": name,
+                "bytes": os.path.getsize(os.path.join(directory, name)),
+            }
+            for name in os.listdir(directory)
+            if name.endswith(suffix) and not name.startswith(".")
+        ),
+        key=lambda file: file["name"],
+        reverse=True,
+    )
+
+
+def private_file(directory: str, name: str, media_type: str = None):
+    # Only plain file names inside the directory, never a path out of it.
+    if os.path.basename(name) != name or name.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(path, media_type=media_type, filename=name)
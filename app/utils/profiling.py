@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+current_profile = ContextVar("current_profile", default=None)
+
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "control"}
+SERIALIZATION_FUNCTIONS = {
+    "serialize_response",
+    "jsonable_encoder",
+    "render",
+    "_prepare_response_content",
+}
+
+
+class RequestProfile:
+    # Samples the event loop thread while a request runs and collects the
+    # asyncpg query log, then splits wall time into Python, DB wait and
+    # serialization.
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.idle_samples = 0
+        self.serialization_samples = 0
+        self.samples = 0
+        self.queries = []
+        self.connect_seconds = []
+        self.running = False
+        self.sampler = None
+        self.started = None
+        self.finished = None
+
+    def record_query(self, record):
+        self.queries.append(
+            {
+                "query": " ".join(record.query.split()),
+                "elapsed_ms": round(record.elapsed * 1000, 3),
+                "error": str(record.exception) if record.exception else None,
+            }
+        )
+
+    def record_connect(self, seconds: float):
+        self.connect_seconds.append(seconds)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.running = True
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.running = False
+        self.sampler.join()
+        self.finished = time.perf_counter()
+
+    def sample(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.take_sample(frame)
+            time.sleep(self.interval)
+
+    def take_sample(self, frame):
+        self.samples += 1
+        if frame.f_code.co_name in IDLE_FUNCTIONS:
+            self.idle_samples += 1
+            return
+        stack = []
+        serializing = False
+        while frame is not None:
+            code = frame.f_code
+            serializing = serializing or code.co_name in SERIALIZATION_FUNCTIONS
+            stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        if serializing:
+            self.serialization_samples += 1
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        # Brendan Gregg's folded format, readable by flamegraph.pl and speedscope.
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        wall = (self.finished or time.perf_counter()) - self.started
+        samples = max(self.samples, 1)
+        db_wait = sum(query["elapsed_ms"] for query in self.queries) / 1000
+        db_wait += sum(self.connect_seconds)
+        busy = wall * (samples - self.idle_samples) / samples
+        serialization = wall * self.serialization_samples / samples
+        return {
+            "wall_ms": round(wall * 1000, 3),
+            "python_ms": round((busy - serialization) * 1000, 3),
+            "serialization_ms": round(serialization * 1000, 3),
+            "db_wait_ms": round(db_wait * 1000, 3),
+            "db_connect_ms": round(sum(self.connect_seconds) * 1000, 3),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "queries": self.queries,
+        }
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import time
+from utils.deadline import current_deadline
+from config import SINGLE_FLIGHT_ENABLED
+
+
+class Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution and its result.
+    # Nothing is cached: the key is forgotten as soon as the call finishes.
+    # Keys must include everything the result depends on, including who is
+    # asking when the result is scoped to a user. The shared call runs in a
+    # fresh context, without the first caller's deadline (and so its
+    # statement_timeout) or profile; every caller waits only as long as its
+    # own deadline allows.
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.flights = {}
+        self.executions = 0
+        self.shared = 0
+
+    def forget(self, key, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    async def do(self, key, call):
+        if not self.enabled:
+            return await call()
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(contextvars.Context().run(asyncio.ensure_future, call()))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self.forget(key, flight))
+            self.executions += 1
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            # shield: one caller going away must not cancel the others' result.
+            deadline = current_deadline.get()
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller went away, stop the database work. The key is
+                # dropped now, not when the cancellation lands, so a new
+                # caller starts a fresh flight instead of joining this one.
+                self.forget(key, flight)
+                flight.task.cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self.flights),
+            "executions": self.executions,
+            "shared": self.shared,
+        }
+
+
+def scope_key(userInfo: dict):
+    # Artist users see results narrowed to themselves.
+    if userInfo.get("role") == "artist":
+        return ("artist", userInfo.get("id"))
+    return (userInfo.get("role"),)
+
+
+single_flight = SingleFlight(SINGLE_FLIGHT_ENABLED)